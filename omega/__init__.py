@@ -32,7 +32,7 @@ __version__ = "0.dev0"  # cranko project-version
 
 from .base import *
 from .rect import *
-from . import layout, rect, render, stamps, styles, util
+from . import colorize, layout, rect, render, stamps, styles, util
 
 from .layout import Overlay, Grid
 from .styles import BlackOnWhiteBitmap, WhiteOnBlackBitmap
@@ -43,6 +43,7 @@ from .util import (
     quickHist,
     quickContours,
     quickImage,
+    quickColorImage,
     quickPager,
     _demo,
 )
@@ -46,9 +46,14 @@ def _makeLonPainter(axis):
 
 
 class AstimageCoordinates(rect.RectCoordinates):
+    # The number of points sampled along each of the top and bottom edges
+    # of the image when looking for longitude discontinuities.
+    _sniffSamples = 2048
+
     def __init__(self, image, field_or_plot):
         super(AstimageCoordinates, self).__init__(field_or_plot)
         self.image = image
+        self._batched = {}
         self.refworld = self.image.toworld(np.zeros_like(self.image.shape))
         self._sniff_discontinuities()
 
@@ -70,66 +75,52 @@ class AstimageCoordinates(rect.RectCoordinates):
 
         """
         s = self.image.shape
-        p = np.zeros(s.size)
-        delta = 1e-6
-        toworld = self.image.toworld
 
         # For now, all we do is check for discontinuities along the
-        # x/longitude axes. We run along both the top and the bottom
+        # x/longitude axes. We sample along both the top and the bottom
         # of the image in case the coordinate systems behave
-        # substantially differently there.
-
+        # substantially differently there, transforming all of the
+        # samples at once.
+
+        n = int(min(s[-1], self._sniffSamples))
+        p = np.zeros((s.size, 2, n))
+        p[-2, 1] = s[-2] - 1
+        p[-1] = np.linspace(0, s[-1] - 1, n)
+        w = self._transform("toworld", p.reshape((s.size, 2 * n)))
+        w = w.reshape(p.shape)
         delta_w = 0
 
-        for ypix in 0, s[-2] - 1:
-            if delta_w != 0:
-                break  # found a discontinuity the first time
-
-            p[-2] = ypix
-            p[-1] = 0
-            expected_w = None
-
-            while p[-1] < s[-1]:  # make our way across the image ...
-                w1 = toworld(p)
-                w1[-1] += delta_w
-
-                if expected_w is not None and abs((w1[-1] - expected_w) / w1[-1]) > 0.5:
-                    # The world coordinate changed a LOT more than
-                    # it should have. Looks like we found a discontinuity.
-                    if abs(abs(w1[-1] - expected_w) - 6.28) > 0.1:
-                        raise Exception("expected a 2pi delta at discontinuity")
-                    if delta_w != 0:
-                        raise Exception("can't handle more than one discontinuity")
-
-                    if w1[-1] - expected_w > 0:
-                        delta_w = -2 * np.pi
-                    else:
-                        delta_w = 2 * np.pi
-
-                    w1[-1] += delta_w  # correct for next set of checks
-
-                # How many pixels should we move to get a "smallish"
-                # fractional change in the longitude coordinate? But
-                # clamp the move to be between 1 and 50 pixels, and
-                # make sure that we're mostly moving along the
-                # longitude axis (because we're not checking for
-                # latitude discontinuities, under the assumption that
-                # latitude doesn't change much).
-
-                p[-1] += delta
-                w2 = toworld(p)
-                w2[-1] += delta_w
-                dlondp = (w2[-1] - w1[-1]) / delta
-                dlatdp = (w2[-2] - w1[-2]) / delta
-
-                if abs(dlatdp) > 0.3 * abs(dlondp):
-                    raise Exception(
-                        "X axis does not (always) track the " "longitude axis closely"
-                    )
-
-                dp = min(max(abs(0.05 * w1[-1] / dlondp), 1), 50)
-                expected_w = w2[-1] + dp * dlondp
-                p[-1] += dp
+        for row in 0, 1:
+            dlon = np.diff(w[-1, row])
+            dlat = np.diff(w[-2, row])
+
+            # Neighboring samples are close together, so a change in
+            # longitude of more than pi is a wrap.
+
+            jumps = np.flatnonzero(np.abs(dlon) > np.pi)
+
+            if jumps.size:
+                if np.any(np.abs(np.abs(dlon[jumps]) - 2 * np.pi) > 0.1):
+                    raise Exception("expected a 2pi delta at discontinuity")
+                if jumps.size > 1:
+                    raise Exception("can't handle more than one discontinuity")
+
+                dlon[jumps] -= 2 * np.pi * np.sign(dlon[jumps])
+
+            # Make sure that we're mostly moving along the longitude axis
+            # (because we're not checking for latitude discontinuities,
+            # under the assumption that latitude doesn't change much).
+
+            if np.any(np.abs(dlat) > 0.3 * np.abs(dlon)):
+                raise Exception(
+                    "X axis does not (always) track the " "longitude axis closely"
+                )
+
+            if jumps.size and delta_w == 0:
+                j = jumps[0]
+                delta_w = -2 * np.pi * np.sign(w[-1, row, j + 1] - w[-1, row, j])
+                w1 = w[-1, row, 0]
+                w2 = w[-1, row, -1] + delta_w
 
         if delta_w == 0:
             lon_correct = lambda x: x
@@ -140,28 +131,55 @@ class AstimageCoordinates(rect.RectCoordinates):
             # sensibly explore the areas just beyond the defined image.
             # That's the half pi offset below.
 
-            p[-1] = 0
-            w1 = toworld(p)[-1]
-            p[-1] = s[-1] - 1
-            w2 = toworld(p)[-1] + delta_w
-
             if w1 > w2:
                 # Usual astronomical convention: world coordinate
                 # decreases as pixel coord increases.
                 def lon_correct(x):
-                    if x > w1 + 0.5 * np.pi:
-                        return x + delta_w
-                    return x
+                    return np.where(x > w1 + 0.5 * np.pi, x + delta_w, x)
 
             else:
 
                 def lon_correct(x):
-                    if x < w1 - 0.5 * np.pi:
-                        return x + delta_w
-                    return x
+                    return np.where(x < w1 - 0.5 * np.pi, x + delta_w, x)
 
         self._lon_correct = lon_correct
 
+    def _transform(self, name, coords):
+        """Apply the image's 'toworld' or 'topixel' method to each column
+        of 'coords', an array of shape (naxis, n).
+
+        The whole array is passed in one call if the image supports that.
+        The first time, the result is checked against a call for a single
+        point; if the batched call fails or disagrees, we fall back to a
+        call per point from then on.
+        """
+        func = getattr(self.image, name)
+        batched = self._batched.get(name)
+
+        if batched is not False and coords.shape[1]:
+            try:
+                result = np.asarray(func(coords), dtype=float)
+            except Exception:
+                result = None
+
+            if result is None or result.shape != coords.shape:
+                batched = False
+            elif batched is None:
+                single = np.asarray(func(coords[:, 0]), dtype=float)
+                batched = bool(np.allclose(result[:, 0], single, equal_nan=True))
+
+            self._batched[name] = batched
+
+            if batched:
+                return result
+
+        result = np.empty(coords.shape)
+
+        for i in range(coords.shape[1]):
+            result[:, i] = func(coords[:, i])
+
+        return result
+
     def makeAxis(self, side):
         axis = rect.CoordinateAxis(self, side)
 
@@ -198,60 +216,32 @@ class AstimageCoordinates(rect.RectCoordinates):
         return axis
 
     def lin2arb(self, linx, liny):
-        linx = np.atleast_1d(linx)
-        liny = np.atleast_1d(liny)
+        linx, liny = np.broadcast_arrays(np.atleast_1d(linx), np.atleast_1d(liny))
 
         assert linx.ndim == 1, "can only handle 1d case right now"
 
-        # Deal with vectorization that Numpy makes implicit:
-        # e.g., arbx.size = n, arby.size = 1
-
-        if linx.size == 1:
-            linxval = linx[0]
-            linx = np.empty(liny.shape, linx.dtype)
-            linx.fill(linxval)
-
-        if liny.size == 1:
-            linyval = liny[0]
-            liny = np.empty(linx.shape, liny.dtype)
-            liny.fill(linyval)
+        coords = np.zeros((self.image.shape.size, linx.size))
+        coords[-1] = linx  # longitude is last coord
+        coords[-2] = liny
+        r = self._transform("toworld", coords)
 
         result = np.empty((2, linx.size))
-        coords = np.zeros(self.image.shape.size)
-
-        for i in range(linx.size):
-            coords[-1] = linx[i]  # longitude is last coord
-            coords[-2] = liny[i]
-            r = self.image.toworld(coords)
-            result[0, i] = self._lon_correct(r[-1])  # longitude -> x
-            result[1, i] = r[-2]  # latitude -> y
-
+        result[0] = self._lon_correct(r[-1])  # longitude -> x
+        result[1] = r[-2]  # latitude -> y
         return result
 
     def arb2lin(self, arbx, arby):
-        arbx = np.atleast_1d(arbx)
-        arby = np.atleast_1d(arby)
+        arbx, arby = np.broadcast_arrays(np.atleast_1d(arbx), np.atleast_1d(arby))
 
         assert arbx.ndim == 1, "can only handle 1d case right now"
 
-        if arbx.size == 1:
-            arbxval = arbx[0]
-            arbx = np.empty(arby.shape, arbx.dtype)
-            arbx.fill(arbxval)
-
-        if arby.size == 1:
-            arbyval = arby[0]
-            arby = np.empty(arbx.shape, arby.dtype)
-            arby.fill(arbyval)
+        refworld = np.asarray(self.refworld, dtype=float)
+        coords = np.repeat(refworld[:, None], arbx.size, axis=1)
+        coords[-1] = arbx  # x is last coord
+        coords[-2] = arby
+        r = self._transform("topixel", coords)
 
         result = np.empty((2, arbx.size))
-        coords = np.array(self.refworld)
-
-        for i in range(arbx.size):
-            coords[-1] = arbx[i]  # x is last coord
-            coords[-2] = arby[i]
-            r = self.image.topixel(coords)
-            result[0, i] = r[-1]  # x -> longitude
-            result[1, i] = r[-2]  # y -> latitude
-
+        result[0] = r[-1]  # x -> longitude
+        result[1] = r[-2]  # y -> latitude
         return result
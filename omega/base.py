@@ -23,6 +23,72 @@ Basic classes of OmegaPlot.
 import numpy as np
 
 
+def _float32Suffices(lo, hi):
+    """Check whether single-precision arithmetic is good enough for values
+    spanning @lo to @hi. Float32 has about seven significant digits, so
+    once the magnitude of the values is more than ~1000 times their span,
+    rounding errors start to be visible on a large plot."""
+
+    return max(abs(lo), abs(hi)) <= 1000 * abs(hi - lo)
+
+
+def _storageType(dtype, blocks):
+    """The type in which to store @blocks that are to be converted to
+    @dtype: float64 instead if that's float32 and the values of any
+    block don't suit single precision."""
+
+    if np.dtype(dtype) != np.float32:
+        return dtype
+
+    for a in blocks:
+        if a.dtype != np.float32 and a.size:
+            lo = np.fmin.reduce(a, axis=None)
+            hi = np.fmax.reduce(a, axis=None)
+
+            if not _float32Suffices(lo, hi):
+                return np.float64
+
+    return dtype
+
+
+class _ColumnBlocks(object):
+    """The int or float columns stored by a DataHolder: a stack of 2D
+    blocks of shape (w_i, len), each of which may be an array allocated
+    by the DataHolder or a reference to one supplied by the user."""
+
+    def __init__(self, blocks, len, copied):
+        self.blocks = blocks
+        self.copied = copied
+        self.starts = []
+        nrows = 0
+
+        for b in blocks:
+            self.starts.append(nrows)
+            nrows += b.shape[0]
+
+        self.shape = (nrows, len)
+
+    def columns(self, start, stop):
+        """Return columns @start through @stop (exclusive) as a 2D array.
+        This is a view if they all live in one block and a copy otherwise."""
+
+        pieces = []
+
+        for b, bstart in zip(self.blocks, self.starts):
+            bstop = bstart + b.shape[0]
+
+            if bstop <= start or bstart >= stop:
+                continue
+
+            pieces.append(b[max(start - bstart, 0) : min(stop, bstop) - bstart])
+
+        if len(pieces) == 1:
+            return pieces[0]
+        if len(pieces) == 0:
+            return np.ndarray((0, self.shape[1]))
+        return np.concatenate(pieces)
+
+
 class DataHolder(object):
     """Stores a set of data inputs.
 
@@ -32,14 +98,18 @@ class DataHolder(object):
     number of rows, each of which represents one item to plot in some
     way or another.
 
-    There are two types of columns: integer and floating-point.  (The
-    latter should really be storable as doubles if desired, but that's
-    a FIXME right now). Certain data are truly discrete and hence
-    should really be stored as integers, while most numerical data
-    will be stored as floats. Internally, DataHolder stores the data
-    grouped in one 2D array of integers and one 2D array of
-    floats. When data, the appropriate columns are selected and
-    returned in the manner described below.
+    There are two types of columns: integer and floating-point. (The
+    latter are stored as float64 by default. Setting the floatType
+    attribute, on one DataHolder or on the class, to np.float32 halves
+    the memory needed for them; data that can't be represented well
+    enough in single precision are still stored as float64.) Certain
+    data are truly discrete and hence should really be stored as
+    integers, while most numerical data will be stored as floats.
+    Internally, DataHolder stores the data grouped in one 2D array of
+    integers and one 2D array of floats. (Alternatively, it can keep
+    references to the arrays it was given; see setInts().) When data,
+    the appropriate columns are selected and returned in the manner
+    described below.
 
     The exact number of columns needed may vary depending on options
     that can be set. For instance, an XYDataPainter may only need two
@@ -105,6 +175,8 @@ class DataHolder(object):
     intdata = None
     fltdata = None
     dlen = 0
+    copyData = True
+    floatType = float
 
     def register(self, *widths):
         """Register a consumer with this DataHolder.
@@ -182,9 +254,9 @@ class DataHolder(object):
             if w == 0:
                 ret += (np.ndarray((0, self.dlen)),)
             elif type == self.AxisTypeInt:
-                ret += (self.intdata[intofs + ofs : intofs + ofs + w, :],)
+                ret += (self.intdata.columns(intofs + ofs, intofs + ofs + w),)
             elif type == self.AxisTypeFloat:
-                ret += (self.fltdata[fltofs + ofs : fltofs + ofs + w, :],)
+                ret += (self.fltdata.columns(fltofs + ofs, fltofs + ofs + w),)
 
             if type == self.AxisTypeInt:
                 intofs += self.allocations[i]
@@ -215,9 +287,9 @@ class DataHolder(object):
             if w == 0:
                 ret += (np.ndarray((0, self.dlen)),)
             elif type == self.AxisTypeInt:
-                ret += (self.intdata[intofs : intofs + w, :],)
+                ret += (self.intdata.columns(intofs, intofs + w),)
             elif type == self.AxisTypeFloat:
-                ret += (self.fltdata[fltofs : fltofs + w, :],)
+                ret += (self.fltdata.columns(fltofs, fltofs + w),)
 
             if type == self.AxisTypeInt:
                 intofs += w
@@ -245,11 +317,16 @@ class DataHolder(object):
 
         return np.ndarray((totw, len), dtype=dtype)
 
-    def _setGeneric(self, type, dtype, arrays):
+    def _setGeneric(self, type, dtype, arrays, copy):
         arrays = [np.asarray(x) for x in arrays]
+        blocks = []
         mergedofs = 0
         l = -1
-        naxes = len(self.axistypes)
+        totw = 0
+
+        for atype, w in zip(self.axistypes, self.allocations):
+            if atype == type:
+                totw += w
 
         for i in range(0, len(arrays)):
             a = arrays[i]
@@ -263,34 +340,84 @@ class DataHolder(object):
                 raise Exception("Need to pass ints to for int data (%s)" % a.dtype)
 
             w = a.shape[0]
-            dataofs = 0
 
             if l < 0:
                 l = a.shape[1]
-                merged = self._allocMerged(type, dtype, l)
-                totw = merged.shape[0]
             elif a.shape[1] != l:
                 raise Exception("Expect same-length arrays")
 
             if mergedofs + w > totw:
                 raise Exception("More input data than expected")
 
-            merged[mergedofs : mergedofs + w, :] = a
+            blocks.append(a)
             mergedofs += w
 
         if mergedofs != totw:
             raise Exception("Less input data than required")
 
+        if l < 0:
+            l = 0
+
+        if copy:
+            dtype = _storageType(dtype, blocks)
+            merged = self._allocMerged(type, dtype, l)
+            mergedofs = 0
+
+            for a in blocks:
+                merged[mergedofs : mergedofs + a.shape[0], :] = a
+                mergedofs += a.shape[0]
+
+            self.dlen = l
+            return _ColumnBlocks([merged], l, True)
+
+        # Keep references to the inputs, converting only those that
+        # can't be used as-is.
+
+        copied = False
+
+        for i in range(len(blocks)):
+            if not self._usableAsIs(type, dtype, blocks[i]):
+                blocks[i] = blocks[i].astype(_storageType(dtype, blocks[i : i + 1]))
+                copied = True
+
         self.dlen = l
-        return merged
+        return _ColumnBlocks(blocks, l, copied)
+
+    def _usableAsIs(self, type, dtype, array):
+        # Any integer type is good enough for int data. Single- or
+        # double-precision floats are fine whatever the floatType, since
+        # the mapping code copes with both.
+
+        if type == self.AxisTypeInt:
+            return array.dtype.kind in "ib"
+        return array.dtype in (np.float32, np.float64)
+
+    def madeCopy(self):
+        """Check whether this DataHolder copied the data it was given.
+
+        Arguments: None.
+
+        Returns: True if either the int or float data are stored in
+          arrays allocated by the DataHolder, False if they are stored
+          only as references to (or views of) the caller's arrays.
+        """
+
+        for store in (self.intdata, self.fltdata):
+            if store is not None and store.copied:
+                return True
 
-    def setInts(self, *args):
+        return False
+
+    def setInts(self, *args, **kwargs):
         """Set the integer data of this DataHolder.
 
         Arguments:
 
         *args - An arbitrary number of ndarrays, handled as described
           below.
+        copy - Keyword argument; whether to copy the data into storage
+          owned by the DataHolder. Defaults to the copyData attribute,
+          which is True unless changed.
 
         Returns: self
 
@@ -314,18 +441,31 @@ class DataHolder(object):
 
         The datatypes of the argument ndarrays need not be exactly N.int, but
         they must be integer-type and compatible with N.int.
+
+        By default the data are copied into an array owned by the
+        DataHolder. If the keyword argument copy is False (or the
+        copyData attribute of the DataHolder is False), the DataHolder
+        instead keeps references to the arrays given, so that they must
+        not be modified afterwards. In that case integer arrays are
+        never converted, and the data returned by get() and getAll()
+        are views of the inputs as long as the requested columns come
+        from a single argument.
         """
 
-        self.intdata = self._setGeneric(self.AxisTypeInt, int, args)
+        copy = _kwordDefaulted(kwargs, "copy", bool, self.copyData)
+        _checkKwordsConsumed(kwargs)
+        self.intdata = self._setGeneric(self.AxisTypeInt, int, args, copy)
         return self
 
-    def setFloats(self, *args):
+    def setFloats(self, *args, **kwargs):
         """Set the float data of this DataHolder.
 
         Arguments:
 
         *args - An arbitrary number of ndarrays, handled as described
           in the documentation to setInts ().
+        copy - Keyword argument; whether to copy the data, as described
+          in the documentation to setInts ().
 
         Returns: self
 
@@ -335,10 +475,17 @@ class DataHolder(object):
         integer data.
 
         Integer arrays passed to this function will be upcast to
-        floating-point arrays.
+        floating-point arrays of the type given by the floatType
+        attribute, as will everything else if the data are copied. If
+        floatType is np.float32 but the values span a range that is
+        tiny compared to their magnitude, they are stored as float64
+        anyway. Without copying, single- and double-precision arrays
+        are kept as they are.
         """
 
-        self.fltdata = self._setGeneric(self.AxisTypeFloat, float, args)
+        copy = _kwordDefaulted(kwargs, "copy", bool, self.copyData)
+        _checkKwordsConsumed(kwargs)
+        self.fltdata = self._setGeneric(self.AxisTypeFloat, self.floatType, args, copy)
         return self
 
     def exportIface(self, other):
@@ -418,6 +565,33 @@ class ToplevelPaintParent(object):
             self._painterRef = None
 
 
+def _isVectorTarget(ctxt):
+    """Return True if @ctxt draws onto a vector surface (PDF, PS, SVG,
+    recording), where output should be exact rather than merely
+    pixel-perfect."""
+
+    import cairo
+
+    for name in ("PDFSurface", "PSSurface", "SVGSurface", "RecordingSurface"):
+        stype = getattr(cairo, name, None)
+
+        if stype is not None and isinstance(ctxt.get_target(), stype):
+            return True
+
+    return False
+
+
+def _deviceColumnWidth(ctxt):
+    """Return the width of one device pixel in the user units of @ctxt."""
+
+    dx, dy = ctxt.user_to_device_distance(1.0, 0.0)
+    scale = np.hypot(dx, dy)
+
+    if scale == 0:
+        return 1.0
+    return 1.0 / scale
+
+
 class ContextTooSmallError(Exception):
     pass
 
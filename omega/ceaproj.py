@@ -95,6 +95,16 @@ class SphereCEAProjection(rect.RectCoordinates):
         result[1] = np.arcsin(liny)
         return result
 
+    def lin2arbJacobian(self, linx, liny):
+        linx, liny = np.broadcast_arrays(np.atleast_1d(linx), np.atleast_1d(liny))
+
+        assert linx.ndim == 1, "can only handle 1d case right now"
+
+        result = np.zeros((2, 2, linx.size))
+        result[0, 0] = -1 if self.negatex else 1
+        result[1, 1] = 1 / np.sqrt(1 - liny**2)
+        return result
+
     def arb2lin(self, arbx, arby):
         # arbx = longitude = lambda, arby = latitude = phi
         lon = np.atleast_1d(arbx)
@@ -0,0 +1,264 @@
+# -*- mode: python; coding: utf-8 -*-
+# Copyright Peter Williams <peter@newton.cx> and collaborators.
+#
+# This file is part of omegaplot.
+#
+# Omegaplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Omegaplot is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Omegaplot. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Turning arrays of data values into Cairo ARGB32 pixels.
+
+A ColorLUT samples a colormap, with a stretch applied, into a table of
+packed, premultiplied ARGB32 pixels. Mapping an image through it is
+then a matter of scaling each value into a table index and looking it
+up, done a chunk of rows at a time so that the only full-size array is
+the output -- typically the buffer returned by
+omega.rect.ImagePainter.allocate(). Chunks can be spread across
+threads, since NumPy releases the GIL for all of the work.
+
+Colormaps can be given by name, in which case they come from
+pwkit.colormaps; as a function mapping values in [0, 1] to an (N, 3) or
+(N, 4) array of RGB(A) values in [0, 1]; or as such an array, which is
+interpolated.
+"""
+
+import numpy as np
+
+__all__ = ["ColorLUT", "dataToARGB32", "stretches"]
+
+
+# Stretches map normalized data values in [0, 1] onto [0, 1]. The
+# second element is the default for the adjustable parameter.
+
+stretches = {
+    "linear": (lambda x, a: x, None),
+    "sqrt": (lambda x, a: np.sqrt(x), None),
+    "log": (lambda x, a: np.log10(a * x + 1) / np.log10(a + 1), 1000.0),
+    "asinh": (lambda x, a: np.arcsinh(x / a) / np.arcsinh(1.0 / a), 0.1),
+}
+
+
+def _colormapFunc(cmap):
+    if callable(cmap):
+        return cmap
+
+    if isinstance(cmap, str):
+        from pwkit import colormaps
+
+        if cmap not in colormaps.factory_map:
+            raise ValueError('unknown colormap "%s"' % cmap)
+        return colormaps.factory_map[cmap]()
+
+    colors = np.asarray(cmap, dtype=float)
+
+    if colors.ndim != 2 or colors.shape[1] not in (3, 4) or colors.shape[0] < 1:
+        raise ValueError("colormap array must be of shape (N, 3) or (N, 4)")
+
+    def interp(x):
+        pos = np.linspace(0, 1, colors.shape[0])
+        return np.stack([np.interp(x, pos, c) for c in colors.T], axis=-1)
+
+    return interp
+
+
+def _packARGB32(rgba):
+    """Pack an (N, 3) or (N, 4) array of color components in [0, 1] into
+    premultiplied ARGB32 pixels."""
+
+    rgba = np.clip(np.asarray(rgba, dtype=float), 0, 1)
+
+    if rgba.shape[1] == 3:
+        a = np.ones(rgba.shape[0])
+    else:
+        a = rgba[:, 3]
+
+    c = np.rint(rgba[:, :3] * a[:, None] * 255).astype(np.uint32)
+    a = np.rint(a * 255).astype(np.uint32)
+    return (a << 24) | (c[:, 0] << 16) | (c[:, 1] << 8) | c[:, 2]
+
+
+class ColorLUT(object):
+    """A colormap and stretch sampled into a lookup table of packed,
+    premultiplied ARGB32 pixels.
+
+    'cmap' is the colormap, as described in the module docstring.
+    'stretch' is one of the keys of 'stretches' and 'stretchParam'
+    adjusts it ('log' is log10(a x + 1) / log10(a + 1) and 'asinh' is
+    asinh(x / a) / asinh(1 / a); the others take no parameter). 'size'
+    is the number of table entries: the stretch is applied when the
+    table is built, so steep stretches want large tables. Non-finite
+    data are painted with 'nanColor', a packed pixel value, which is
+    transparent by default.
+    """
+
+    size = 4096
+    stretch = "linear"
+    stretchParam = None
+    nanColor = 0
+    chunkPixels = 1 << 20
+
+    def __init__(
+        self,
+        cmap="white_to_black",
+        stretch=None,
+        size=None,
+        stretchParam=None,
+        nanColor=None,
+    ):
+        if stretch is not None:
+            self.stretch = stretch
+        if size is not None:
+            self.size = int(size)
+        if stretchParam is not None:
+            self.stretchParam = stretchParam
+        if nanColor is not None:
+            self.nanColor = nanColor
+
+        if self.stretch not in stretches:
+            raise ValueError('unknown stretch "%s"' % self.stretch)
+        if self.size < 2:
+            raise ValueError("LUT size must be at least 2")
+
+        func, param = stretches[self.stretch]
+        if self.stretchParam is not None:
+            param = self.stretchParam
+
+        x = func(np.linspace(0, 1, self.size), param)
+
+        # The extra last entry is for non-finite values.
+        self.table = np.empty(self.size + 1, dtype=np.uint32)
+        self.table[:-1] = _packARGB32(_colormapFunc(cmap)(x))
+        self.table[-1] = self.nanColor
+
+    def _mapChunk(self, data, out, lo, scale):
+        if data.dtype == np.float32:
+            t = data - np.float32(lo)
+        else:
+            t = np.subtract(data, lo, dtype=float)
+
+        t *= scale
+        t += 0.5
+        np.clip(t, 0, self.size - 1, out=t)
+        t[~np.isfinite(data)] = self.size
+        np.take(self.table, t.astype(np.intp), out=out, mode="clip")
+
+    def apply(self, data, cmin=None, cmax=None, out=None, threads=None):
+        """Map 'data' to ARGB32 pixels, with 'cmin' and 'cmax' anchoring
+        the ends of the colormap; by default these are the extremes of
+        the finite data. Values outside of that range are clipped to
+        it. Masked values are treated like NaNs.
+
+        If 'out' is given, it must be a uint32 array of the same shape
+        as 'data', such as the one returned by ImagePainter.allocate(),
+        and the pixels are written into it; otherwise a new array is
+        returned. The work is done in chunks of rows of about
+        'chunkPixels' pixels, spread over 'threads' threads if that is
+        more than 1.
+        """
+
+        if np.ma.isMaskedArray(data):
+            data = data.astype(float).filled(np.nan)
+        else:
+            data = np.asarray(data)
+
+        if out is None:
+            out = np.empty(data.shape, dtype=np.uint32)
+        elif out.shape != data.shape:
+            raise ValueError("output array must have the same shape as the data")
+        elif out.dtype.itemsize != 4 or out.dtype.kind not in "ui":
+            raise ValueError("output array must contain 32-bit pixels")
+
+        if out.dtype != np.uint32:
+            out = out.view(np.uint32)
+
+        if data.size == 0:
+            return out
+
+        if cmin is None or cmax is None:
+            with np.errstate(invalid="ignore"):
+                finite = data[np.isfinite(data)]
+
+            if finite.size == 0:
+                lo = hi = 0.0
+            else:
+                lo, hi = finite.min(), finite.max()
+
+            if cmin is None:
+                cmin = lo
+            if cmax is None:
+                cmax = hi
+
+        cmin = float(cmin)
+        cmax = float(cmax)
+
+        if cmax == cmin:
+            scale = 0.0
+        else:
+            scale = (self.size - 1) / (cmax - cmin)
+
+        if data.ndim == 0:
+            self._mapChunk(data[None], out[None], cmin, scale)
+            return out
+
+        rowPixels = max(data.size // data.shape[0], 1)
+        step = max(self.chunkPixels // rowPixels, 1)
+        chunks = [slice(i, i + step) for i in range(0, data.shape[0], step)]
+
+        if threads is None or threads < 2 or len(chunks) < 2:
+            for s in chunks:
+                self._mapChunk(data[s], out[s], cmin, scale)
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                futures = [
+                    executor.submit(self._mapChunk, data[s], out[s], cmin, scale)
+                    for s in chunks
+                ]
+
+                for f in futures:
+                    f.result()
+
+        return out
+
+
+_lutCache = {}
+
+
+def dataToARGB32(
+    data,
+    cmin=None,
+    cmax=None,
+    stretch="linear",
+    cmap="white_to_black",
+    out=None,
+    threads=None,
+    size=None,
+):
+    """Map 'data' to ARGB32 pixels through a colormap. This is
+    shorthand for ColorLUT(cmap, stretch, size).apply(data, cmin,
+    cmax, out, threads); the tables for named colormaps are reused
+    between calls.
+    """
+
+    if isinstance(cmap, str):
+        key = (cmap, stretch, size)
+        lut = _lutCache.get(key)
+
+        if lut is None:
+            lut = _lutCache[key] = ColorLUT(cmap, stretch, size)
+    else:
+        lut = ColorLUT(cmap, stretch, size)
+
+    return lut.apply(data, cmin, cmax, out, threads)
@@ -0,0 +1,299 @@
+# -*- mode: python; coding: utf-8 -*-
+# Copyright Peter Williams <peter@newton.cx> and collaborators.
+#
+# This file is part of omegaplot.
+#
+# Omegaplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Omegaplot is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Omegaplot. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Interpolated stand-ins for expensive coordinate systems.
+
+Coordinate systems backed by WCS libraries can be slow per call, while
+painting a plot can require a great many transforms. An
+InterpolatedCoordinates wraps any RectCoordinates, samples its lin2arb
+and arb2lin over the field once, and then answers queries by bicubic
+interpolation of the samples. The sample grids are refined until the
+interpolation error, checked at several points in every cell, is
+within tolerance; cells where that never happens, such as those
+straddling a discontinuity or the edge of the region where the
+transform is defined, and points outside of the sampled region are
+passed on to the wrapped coordinate system.
+
+Usage::
+
+  coords = InterpolatedCoordinates(astimage.AstimageCoordinates(im, p))
+  p.paintCoordinates(coords)
+"""
+
+import numpy as np
+
+from . import rect
+
+__all__ = ["InterpolatedCoordinates"]
+
+
+# Where interpolation errors are checked within each cell, and the
+# fraction of the tolerance that they're allowed to reach there.
+_checkOffsets = np.array([0.25, 0.75])
+_checkMargin = 0.5
+
+
+def _cubicWeights(t):
+    """Catmull-Rom weights of the four samples around fractional offset 't'."""
+    t2 = t * t
+    t3 = t2 * t
+    return (
+        0.5 * (-t3 + 2 * t2 - t),
+        0.5 * (3 * t3 - 5 * t2 + 2),
+        0.5 * (-3 * t3 + 4 * t2 + t),
+        0.5 * (t3 - t2),
+    )
+
+
+def _grow(mask):
+    """Extend a 2D boolean mask to all eight neighbors of its True cells."""
+    grown = mask.copy()
+    grown[1:] |= mask[:-1]
+    grown[:-1] |= mask[1:]
+    rows = grown.copy()
+    grown[:, 1:] |= rows[:, :-1]
+    grown[:, :-1] |= rows[:, 1:]
+    return grown
+
+
+class _SampleGrid(object):
+    """Samples of a transform at n by n points evenly covering [x0, x1] by
+    [y0, y1], plus a ring of samples just outside so that every cell has
+    a full bicubic stencil. Cells flagged in 'bad' are not interpolated.
+    """
+
+    def __init__(self, func, x0, x1, y0, y1, n):
+        self.x0 = x0
+        self.y0 = y0
+        self.n = n
+        self.dx = (x1 - x0) / (n - 1)
+        self.dy = (y1 - y0) / (n - 1)
+
+        i = np.arange(-1, n + 1)
+        gx, gy = np.meshgrid(x0 + i * self.dx, y0 + i * self.dy, indexing="ij")
+        self.values = func(gx.ravel(), gy.ravel()).reshape((2, n + 2, n + 2))
+        self.bad = np.zeros((n - 1, n - 1), dtype=bool)
+
+    def locate(self, x, y):
+        """Returns (usable, i, j, tx, ty): which points can be interpolated,
+        and the cell indices and fractional offsets within the cells of all
+        of the points."""
+        fx = (x - self.x0) / self.dx
+        fy = (y - self.y0) / self.dy
+        last = self.n - 1
+
+        with np.errstate(invalid="ignore"):
+            usable = (fx >= 0) & (fx <= last) & (fy >= 0) & (fy <= last)
+
+        fx = np.where(usable, fx, 0)
+        fy = np.where(usable, fy, 0)
+        i = np.minimum(np.floor(fx).astype(int), last - 1)
+        j = np.minimum(np.floor(fy).astype(int), last - 1)
+        usable &= ~self.bad[i, j]
+        return usable, i, j, fx - i, fy - j
+
+    def interpolate(self, i, j, tx, ty):
+        wx = _cubicWeights(tx)
+        wy = _cubicWeights(ty)
+        result = np.zeros((2, i.size))
+
+        # Cell (i, j) spans samples i-1 to i+2, which are offset by one
+        # in 'values' because of the outer ring.
+
+        for a in range(4):
+            for b in range(4):
+                result += wx[a] * wy[b] * self.values[:, i + a, j + b]
+
+        return result
+
+
+class InterpolatedCoordinates(rect.RectCoordinates):
+    """Wraps the RectCoordinates 'coordsys', interpolating its transforms.
+
+    The grids are built on first use, and rebuilt whenever the bounds of
+    the field change. 'tolerance' is the largest interpolation error
+    allowed, relative to the span of each component of the transform's
+    output over the sampled region. Grids start with 'minSamples' points
+    on a side and are refined, up to 'maxSamples' points, while that
+    reduces the errors in the cells that fail the tolerance check.
+
+    The 'nInterpolated' and 'nExact' attributes count the points answered
+    each way.
+    """
+
+    tolerance = 1e-5
+    minSamples = 9
+    maxSamples = 257
+
+    def __init__(self, coordsys, tolerance=None, maxSamples=None):
+        self.coordsys = coordsys
+
+        if tolerance is not None:
+            self.tolerance = tolerance
+        if maxSamples is not None:
+            self.maxSamples = maxSamples
+
+        self.nInterpolated = 0
+        self.nExact = 0
+        self.rebuild()
+
+    @property
+    def field(self):
+        return self.coordsys.field
+
+    @field.setter
+    def field(self, value):
+        self.coordsys.field = value
+
+    def makeAxis(self, side):
+        axis = self.coordsys.makeAxis(side)
+        axis.coordsys = self
+        return axis
+
+    def rebuild(self):
+        """Discard the sample grids; they are rebuilt on next use."""
+        self._boundsKey = None
+        self._linGrid = None
+        self._arbGrid = None
+
+    def _buildGrid(self, func, x0, x1, y0, y1):
+        if not (np.isfinite([x0, x1, y0, y1]).all() and x0 != x1 and y0 != y1):
+            return None
+
+        n = self.minSamples
+        prevWorst = None
+
+        while True:
+            grid = _SampleGrid(func, x0, x1, y0, y1, n)
+            values = grid.values.reshape((2, -1))
+            values = values[:, np.isfinite(values).all(axis=0)]
+
+            if values.size == 0:
+                return None
+
+            span = values.max(axis=1) - values.min(axis=1)
+
+            # The leading error term of the interpolation vanishes at the
+            # middles and edges of the cells, so check it at the quarter
+            # points, near where it peaks, and leave a margin for the
+            # places in between.
+
+            c = np.arange(n - 1)
+            i, j, tx, ty = [
+                a.ravel()
+                for a in np.meshgrid(c, c, _checkOffsets, _checkOffsets, indexing="ij")
+            ]
+            approx = grid.interpolate(i, j, tx, ty)
+            exact = func(x0 + (i + tx) * grid.dx, y0 + (j + ty) * grid.dy)
+            limit = _checkMargin * self.tolerance * span[:, np.newaxis]
+
+            # How far over the limit each cell goes; non-finite errors
+            # count as infinitely far.
+
+            err = np.abs(approx - exact)
+
+            with np.errstate(invalid="ignore", divide="ignore"):
+                ratio = np.where(err <= limit, 0.0, err / limit)
+
+            ratio[np.isnan(ratio)] = np.inf
+            ratio = ratio.max(axis=0).reshape((n - 1, n - 1, -1)).max(axis=2)
+            failing = ratio > 1
+
+            # Stencils of cells next to a bad one reach into it, so
+            # don't trust them either.
+
+            grid.bad = _grow(failing)
+
+            if not failing.any() or 2 * n - 1 > self.maxSamples:
+                return grid
+
+            # Smooth errors shrink quickly as the grid is refined, but
+            # those around a discontinuity or the edge of the valid region
+            # don't; stop refining once the failing cells stop improving.
+
+            worst = np.median(ratio[failing])
+
+            if prevWorst is not None and not worst < 0.5 * prevWorst:
+                return grid
+
+            prevWorst = worst
+            n = 2 * n - 1
+
+    def _grids(self):
+        xaxis = self.field.xaxis
+        yaxis = self.field.yaxis
+        key = (xaxis.min, xaxis.max, yaxis.min, yaxis.max)
+
+        if key != self._boundsKey:
+            x0, x1 = sorted(key[:2])
+            y0, y1 = sorted(key[2:])
+            cs = self.coordsys
+            self._linGrid = self._buildGrid(cs.lin2arb, x0, x1, y0, y1)
+            self._arbGrid = None
+
+            if self._linGrid is not None:
+                arb = self._linGrid.values[:, 1:-1, 1:-1].reshape((2, -1))
+                arb = arb[:, np.isfinite(arb).all(axis=0)]
+
+                if arb.size:
+                    lo = arb.min(axis=1)
+                    hi = arb.max(axis=1)
+                    self._arbGrid = self._buildGrid(
+                        cs.arb2lin, lo[0], hi[0], lo[1], hi[1]
+                    )
+
+            self._boundsKey = key
+
+        return self._linGrid, self._arbGrid
+
+    def _query(self, grid, func, x, y):
+        x, y = np.broadcast_arrays(np.atleast_1d(x), np.atleast_1d(y))
+
+        assert x.ndim == 1, "can only handle 1d case right now"
+
+        result = np.empty((2, x.size))
+
+        if grid is None:
+            usable = np.zeros(x.size, dtype=bool)
+        else:
+            usable, i, j, tx, ty = grid.locate(x, y)
+            result[:, usable] = grid.interpolate(
+                i[usable], j[usable], tx[usable], ty[usable]
+            )
+            usable &= np.isfinite(result).all(axis=0)
+
+        exact = ~usable
+
+        if exact.any():
+            result[:, exact] = func(x[exact], y[exact])
+
+        self.nInterpolated += x.size - exact.sum()
+        self.nExact += exact.sum()
+        return result
+
+    def lin2arb(self, linx, liny):
+        return self._query(self._grids()[0], self.coordsys.lin2arb, linx, liny)
+
+    def arb2lin(self, arbx, arby):
+        return self._query(self._grids()[1], self.coordsys.arb2lin, arbx, arby)
+
+    def lin2arbJacobian(self, linx, liny):
+        # The wrapped system's analytic derivatives, if any, are cheap
+        # compared to finite differences of the interpolants.
+        return self.coordsys.lin2arbJacobian(linx, liny)
@@ -0,0 +1,610 @@
+# -*- mode: python; coding: utf-8 -*-
+# Copyright Peter Williams <peter@newton.cx> and collaborators.
+#
+# This file is part of omegaplot.
+#
+# Omegaplot is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published
+# by the Free Software Foundation, either version 3 of the License,
+# or (at your option) any later version.
+#
+# Omegaplot is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Omegaplot. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Vectorized helpers for preparing paths and handing them to Cairo.
+
+Everything here operates on arrays of coordinates that have already been
+mapped into the painter's user space, so that the painters can throw away
+work that would be invisible at the output resolution without issuing a
+Cairo call per vertex. appendPath() is the one place where vertex arrays
+are turned into Cairo path operations.
+
+Running this module as a script times appendPath() against the naive
+approach; this requires pycairo.
+"""
+
+import numpy as np
+
+
+def decimateMinMax(x, y, colwidth=1.0):
+    """Reduce a polyline to the samples that matter at a given resolution.
+
+    Arguments:
+
+    x - 1D array of mapped X coordinates.
+    y - 1D array of mapped Y coordinates, the same size as @x.
+    colwidth - The width of one device pixel column, in the units of @x.
+
+    Returns: (x, y, ndropped), where @x and @y are the retained samples
+      (in their original order) and @ndropped is the number of samples
+      that were discarded.
+
+    Consecutive samples falling into the same pixel column are collapsed
+    to the first, minimum, maximum, and last of them (the "M4"
+    reduction). Stroking the reduced polyline lights up the same pixels
+    as stroking the full one, so the result looks the same at the output
+    resolution. Non-finite samples are always kept and never merged with
+    their neighbors, so that gaps in the data stay gaps.
+    """
+
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = x.size
+
+    if n < 5:
+        return x, y, 0
+
+    good = np.isfinite(x) & np.isfinite(y)
+    col = np.floor(np.where(good, x, 0) / colwidth)
+
+    newrun = np.empty(n, dtype=bool)
+    newrun[0] = True
+    newrun[1:] = (col[1:] != col[:-1]) | ~good[1:] | ~good[:-1]
+
+    starts = np.flatnonzero(newrun)
+    nruns = starts.size
+
+    if nruns * 4 >= n:
+        return x, y, 0
+
+    lasts = np.empty(nruns, dtype=starts.dtype)
+    lasts[:-1] = starts[1:] - 1
+    lasts[-1] = n - 1
+
+    runid = np.cumsum(newrun) - 1
+    yv = np.where(good, y, 0)
+
+    # For each run, find the first index at which its min and max are
+    # attained. Comparing against the broadcast reductions keeps this
+    # O(n) with no sorting.
+
+    keep = np.zeros(n, dtype=bool)
+    keep[starts] = True
+    keep[lasts] = True
+
+    for reducer in (np.minimum, np.maximum):
+        extreme = reducer.reduceat(yv, starts)[runid]
+        hits = np.flatnonzero(yv == extreme)
+        first = np.ones(hits.size, dtype=bool)
+        first[1:] = runid[hits[1:]] != runid[hits[:-1]]
+        keep[hits[first]] = True
+
+    idx = np.flatnonzero(keep)
+    return x[idx], y[idx], n - idx.size
+
+
+def simplifyPolyline(x, y, tolerance):
+    """Simplify a polyline, moving it by no more than a given distance.
+
+    Arguments:
+
+    x, y - 1D arrays of vertex coordinates.
+    tolerance - The largest distance that the simplified line may
+      deviate from the original one, in the units of @x and @y.
+
+    Returns: (x, y, ndropped), where @x and @y are the retained vertices
+      (in their original order) and @ndropped is the number of vertices
+      that were discarded.
+
+    This is the Douglas-Peucker algorithm. Rather than recursing, each
+    pass splits every pending span of the polyline at once, at its
+    vertex farthest from the chord between the span's ends, so the
+    number of passes is the depth of the recursion. Distances are
+    measured to the chord as a segment, so closed loops whose ends
+    coincide are handled. Non-finite vertices are kept and break the
+    line into runs that are simplified separately; the ends of each run
+    are always kept.
+    """
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = x.size
+
+    if n < 3 or not tolerance > 0:
+        return x, y, 0
+
+    good = np.isfinite(x) & np.isfinite(y)
+    edges = np.diff(np.concatenate(([0], good.astype(np.int8), [0])))
+    a = np.flatnonzero(edges == 1)
+    b = np.flatnonzero(edges == -1) - 1
+
+    keep = ~good
+    keep[a] = True
+    keep[b] = True
+
+    tol2 = float(tolerance) ** 2
+    pending = b - a > 1
+    a = a[pending]
+    b = b[pending]
+
+    while a.size:
+        nint = b - a - 1
+        offsets = np.cumsum(nint) - nint
+        span = np.repeat(np.arange(a.size), nint)
+        idx = np.arange(span.size) + np.repeat(a + 1 - offsets, nint)
+
+        ax = x[a][span]
+        ay = y[a][span]
+        cx = x[b][span] - ax
+        cy = y[b][span] - ay
+        px = x[idx] - ax
+        py = y[idx] - ay
+
+        clen2 = cx * cx + cy * cy
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(clen2 > 0, (px * cx + py * cy) / clen2, 0.0)
+        t = np.clip(t, 0, 1)
+        dx = px - t * cx
+        dy = py - t * cy
+        d2 = dx * dx + dy * dy
+
+        # The first vertex attaining each span's maximum distance.
+
+        dmax = np.maximum.reduceat(d2, offsets)
+        hits = np.flatnonzero(d2 == dmax[span])
+        first = np.ones(hits.size, dtype=bool)
+        first[1:] = span[hits[1:]] != span[hits[:-1]]
+        hits = hits[first]
+
+        split = dmax > tol2
+        mid = idx[hits][split]
+        keep[mid] = True
+
+        a = np.concatenate((a[split], mid))
+        b = np.concatenate((mid, b[split]))
+        pending = b - a > 1
+        a = a[pending]
+        b = b[pending]
+
+    idx = np.flatnonzero(keep)
+    return x[idx], y[idx], n - idx.size
+
+
+def _liangBarsky(x0, y0, x1, y1, xmin, xmax, ymin, ymax):
+    """Vectorized Liang-Barsky parameters of segments against a rectangle.
+
+    Returns (t0, t1, visible), where the visible part of segment i runs
+    from parameter t0[i] to t1[i]. Segments touching non-finite
+    coordinates are never visible.
+    """
+
+    dx = x1 - x0
+    dy = y1 - y0
+    t0 = np.zeros(x0.shape)
+    t1 = np.ones(x0.shape)
+    visible = np.isfinite(x0) & np.isfinite(y0) & np.isfinite(x1) & np.isfinite(y1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p, q in (
+            (-dx, x0 - xmin),
+            (dx, xmax - x0),
+            (-dy, y0 - ymin),
+            (dy, ymax - y0),
+        ):
+            visible &= (p != 0) | (q >= 0)
+            r = q / p
+            t0 = np.where(p < 0, np.maximum(t0, r), t0)
+            t1 = np.where(p > 0, np.minimum(t1, r), t1)
+
+    visible &= t0 <= t1
+    return t0, t1, visible
+
+
+def clipPolyline(x, y, xmin, xmax, ymin, ymax):
+    """Discard the parts of a polyline that cannot be seen in a rectangle.
+
+    Arguments:
+
+    x, y - 1D arrays of vertex coordinates.
+    xmin, xmax, ymin, ymax - The bounds of the region in which the line
+      may be visible. This should already be padded to allow for the
+      line width and joins.
+
+    Returns: (x, y), the vertices of the visible runs of the polyline.
+      Separate runs are delimited by a vertex with NaN coordinates.
+
+    Only the segments that intersect the rectangle are kept. They are
+    cut down to a guard region one rectangle-size larger on each side,
+    so the vertices just outside the visible region are kept (or pulled
+    in along their segment, keeping its direction) and line joins at
+    the edge of the region are drawn as they would be for the full
+    line. Non-finite vertices break the line.
+    """
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    if x.size < 2:
+        return x, y
+
+    x0, y0, x1, y1 = x[:-1], y[:-1], x[1:], y[1:]
+    ign, ign, visible = _liangBarsky(x0, y0, x1, y1, xmin, xmax, ymin, ymax)
+
+    if visible.all() and x.min() >= xmin and x.max() <= xmax:
+        if y.min() >= ymin and y.max() <= ymax:
+            return x, y
+
+    gxmin = xmin - (xmax - xmin)
+    gxmax = xmax + (xmax - xmin)
+    gymin = ymin - (ymax - ymin)
+    gymax = ymax + (ymax - ymin)
+
+    vis = np.flatnonzero(visible)
+
+    if vis.size == 0:
+        return np.zeros(0), np.zeros(0)
+
+    x0, y0, x1, y1 = x0[vis], y0[vis], x1[vis], y1[vis]
+    t0, t1, ign = _liangBarsky(x0, y0, x1, y1, gxmin, gxmax, gymin, gymax)
+    dx = x1 - x0
+    dy = y1 - y0
+    sx = np.where(t0 == 0, x0, x0 + t0 * dx)
+    sy = np.where(t0 == 0, y0, y0 + t0 * dy)
+    ex = np.where(t1 == 1, x1, x0 + t1 * dx)
+    ey = np.where(t1 == 1, y1, y0 + t1 * dy)
+
+    # A visible segment continues the previous run if the two are
+    # adjacent and their shared vertex was not pulled in.
+
+    cont = np.zeros(vis.size, dtype=bool)
+    cont[1:] = (vis[1:] == vis[:-1] + 1) & (t1[:-1] == 1) & (t0[1:] == 0)
+
+    counts = np.where(cont, 1, 3)
+    ends = np.cumsum(counts)
+    ox = np.empty(ends[-1])
+    oy = np.empty(ends[-1])
+
+    ox[ends - 1] = ex
+    oy[ends - 1] = ey
+    new = ends[~cont]
+    ox[new - 2] = sx[~cont]
+    oy[new - 2] = sy[~cont]
+    ox[new - 3] = np.nan
+    oy[new - 3] = np.nan
+
+    return ox[1:], oy[1:]
+
+
+def clipPolygon(x, y, xmin, xmax, ymin, ymax):
+    """Clip a closed polygon to a rectangle.
+
+    Arguments:
+
+    x, y - 1D arrays of the polygon's vertex coordinates. The polygon
+      is implicitly closed.
+    xmin, xmax, ymin, ymax - The bounds of the clipping rectangle.
+
+    Returns: (x, y), the vertices of the clipped polygon, which may be
+      empty.
+
+    This is the Sutherland-Hodgman algorithm, run against each side of
+    the rectangle in turn with every polygon edge handled at once. Parts
+    of the polygon outside the rectangle collapse onto its sides, so the
+    rectangle should be padded beyond the visible region if the polygon
+    is to be stroked. Polygons with non-finite vertices are returned
+    unchanged.
+    """
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    if x.size < 3 or not (np.isfinite(x).all() and np.isfinite(y).all()):
+        return x, y
+
+    for coord, bound, keepAbove in (
+        (0, xmin, True),
+        (0, xmax, False),
+        (1, ymin, True),
+        (1, ymax, False),
+    ):
+        if x.size == 0:
+            break
+
+        c = x if coord == 0 else y
+
+        if keepAbove:
+            inside = c >= bound
+        else:
+            inside = c <= bound
+
+        if inside.all():
+            continue
+
+        # Edge i runs from vertex i to vertex i+1 (cyclically). It
+        # contributes its crossing point if it crosses the boundary,
+        # then its end vertex if that is inside.
+
+        nx = np.roll(x, -1)
+        ny = np.roll(y, -1)
+        nin = np.roll(inside, -1)
+        nc = np.roll(c, -1)
+        cross = inside != nin
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = (bound - c) / (nc - c)
+            ix = x + t * (nx - x)
+            iy = y + t * (ny - y)
+
+        if coord == 0:
+            ix = np.where(cross, bound, ix)
+        else:
+            iy = np.where(cross, bound, iy)
+
+        counts = cross.astype(int) + nin
+        ends = np.cumsum(counts)
+        total = ends[-1] if ends.size else 0
+        ox = np.empty(total)
+        oy = np.empty(total)
+
+        w = nin
+        ox[ends[w] - 1] = nx[w]
+        oy[ends[w] - 1] = ny[w]
+        w = cross
+        pos = ends[w] - 1 - nin[w]
+        ox[pos] = ix[w]
+        oy[pos] = iy[w]
+
+        x, y = ox, oy
+
+    return x, y
+
+
+def joinPolylines(pieces):
+    """Join consecutive pieces of one polyline back together.
+
+    Arguments:
+
+    pieces - A sequence of (x, y) tuples of 1D arrays. Each piece is
+      expected to start at the vertex where the previous one ended, as
+      for overlapping chunks of a long polyline that have been clipped
+      separately.
+
+    Returns: (x, y), the joined polyline.
+
+    Where a piece starts at exactly the last vertex of the one before,
+    the repeated vertex is dropped. Otherwise (for instance, because
+    clipping moved the shared vertex) a NaN break is inserted, just as
+    clipPolyline() would have done for the unbroken polyline.
+    """
+
+    xs = []
+    ys = []
+    lastx = lasty = None
+
+    for x, y in pieces:
+        if x.size == 0:
+            continue
+
+        if lastx is not None:
+            if x[0] == lastx and y[0] == lasty:
+                x = x[1:]
+                y = y[1:]
+            else:
+                xs.append(np.array([np.nan]))
+                ys.append(np.array([np.nan]))
+
+        if x.size == 0:
+            continue
+
+        xs.append(x)
+        ys.append(y)
+        lastx = x[-1]
+        lasty = y[-1]
+
+    if not len(xs):
+        return np.zeros(0), np.zeros(0)
+
+    return np.concatenate(xs), np.concatenate(ys)
+
+
+def monotonicDirection(x):
+    """Find which way a sequence of values runs.
+
+    Arguments:
+
+    x - 1D array of values.
+
+    Returns: 1 if the values never decrease, -1 if they never increase, 0
+      if they are all equal (or there are fewer than two of them), and
+      None if they are not sorted at all.
+    """
+
+    d = np.diff(np.asarray(x))
+
+    if d.size == 0:
+        return 0
+
+    up = d.max() > 0
+    down = d.min() < 0
+
+    if up and down:
+        return None
+    if up:
+        return 1
+    if down:
+        return -1
+    return 0
+
+
+def steppedVertices(lefts, rights, values, breaks=None):
+    """Build the vertices of a stepped, histogram-style line.
+
+    Arguments:
+
+    lefts - 1D array of the X coordinates of the left edges of the bins.
+    rights - 1D array of the X coordinates of the right edges of the bins.
+    values - 1D array of the Y coordinates of the bins.
+    breaks - Optional 1D boolean array; where true, the line is broken
+      before the corresponding bin rather than connected to the previous
+      one. The first element is ignored.
+
+    Returns: (x, y), the vertices of the line, with separate runs
+      delimited by a vertex with NaN coordinates as for clipPolyline().
+
+    Each bin contributes a horizontal segment from its left to its right
+    edge. Consecutive bins are joined by a line from the right edge of one
+    to the left edge of the next, which is vertical if the two edges
+    coincide.
+    """
+
+    values = np.asarray(values, dtype=float)
+    n = values.size
+    x = np.empty(2 * n)
+    x[0::2] = lefts
+    x[1::2] = rights
+    y = np.repeat(values, 2)
+
+    if breaks is not None:
+        pos = 2 * np.flatnonzero(breaks[1:]) + 2
+
+        if pos.size:
+            x = np.insert(x, pos, np.nan)
+            y = np.insert(y, pos, np.nan)
+
+    return x, y
+
+
+def appendPath(ctxt, xy, breaks=None, close=False):
+    """Add a polyline given as an array of vertices to a Cairo path.
+
+    Arguments:
+
+    ctxt - The Cairo context whose current path is extended.
+    xy - (N, 2) array of vertex coordinates, in user space.
+    breaks - Optional 1D boolean array of size N; where true, a new
+      subpath is started at the corresponding vertex.
+    close - If true, every subpath is closed.
+
+    Returns: None.
+
+    Each subpath starts with a move_to, so the polyline is never joined
+    onto whatever the path already holds. Vertices with non-finite
+    coordinates are dropped and also start a new subpath, so the NaN
+    separators returned by clipPolyline() and friends work as breaks.
+
+    All of the painters build their paths through this function, so that
+    speeding it up speeds up all of them. For now it issues one line_to()
+    per vertex, with the per-call overhead kept to a minimum.
+    """
+
+    xy = np.asarray(xy, dtype=float)
+    n = xy.shape[0]
+
+    if n == 0:
+        return
+
+    good = np.isfinite(xy).all(axis=1)
+    starts = np.empty(n, dtype=bool)
+    starts[0] = True
+    starts[1:] = ~good[:-1]
+
+    if breaks is not None:
+        starts |= breaks
+
+    if not good.all():
+        xy = xy[good]
+        starts = starts[good]
+
+    bounds = np.flatnonzero(starts).tolist()
+    bounds.append(xy.shape[0])
+    pts = xy.tolist()
+
+    move_to = ctxt.move_to
+    line_to = ctxt.line_to
+
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        move_to(*pts[a])
+
+        for px, py in pts[a + 1 : b]:
+            line_to(px, py)
+
+        if close:
+            ctxt.close_path()
+
+
+def strokePath(ctxt, xy, breaks=None, chunkSize=100):
+    """Stroke a polyline given as for appendPath(), a chunk of @chunkSize
+    vertices at a time so that the path never gets too long. Successive
+    chunks share a vertex, so the line is continuous."""
+
+    n = xy.shape[0]
+
+    for start in range(0, max(n - 1, 1), chunkSize):
+        s = slice(start, start + chunkSize + 1)
+        appendPath(ctxt, xy[s], None if breaks is None else breaks[s])
+        ctxt.stroke()
+
+
+def _benchmark(n=200000, repeat=3):
+    """Time appendPath() against one Python-level Cairo call per vertex,
+    printing the best of @repeat runs for @n vertices."""
+
+    import time
+    import cairo
+
+    rng = np.random.default_rng(0)
+    xy = np.cumsum(rng.normal(size=(n, 2)), axis=0)
+    broken = xy.copy()
+    broken[::50] = np.nan
+
+    surf = cairo.ImageSurface(cairo.FORMAT_ARGB32, 16, 16)
+    ctxt = cairo.Context(surf)
+
+    def naive(ctxt, xy):
+        started = False
+
+        for i in range(xy.shape[0]):
+            if xy[i, 0] != xy[i, 0]:
+                started = False
+            elif not started:
+                ctxt.move_to(xy[i, 0], xy[i, 1])
+                started = True
+            else:
+                ctxt.line_to(xy[i, 0], xy[i, 1])
+
+    for label, data in (("unbroken", xy), ("broken", broken)):
+        for name, func in (("naive", naive), ("appendPath", appendPath)):
+            best = None
+
+            for i in range(repeat):
+                ctxt.new_path()
+                t0 = time.perf_counter()
+                func(ctxt, data)
+                elapsed = time.perf_counter() - t0
+
+                if best is None or elapsed < best:
+                    best = elapsed
+
+            print("%-9s %-11s %8.1f ms" % (label, name, best * 1e3))
+
+    ctxt.new_path()
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -20,42 +20,548 @@
 Rectangular plots.
 """
 
+from collections import OrderedDict
+
 import cairo
 import numpy as np
 
 from .base import *
-from .base import _kwordDefaulted, _kwordExtract
+from .base import _kwordDefaulted, _kwordExtract, _ColumnBlocks, _float32Suffices
+from .base import _isVectorTarget, _deviceColumnWidth
 from .base import textMarkup as TM
 from .layout import RightRotationPainter
+from .paths import decimateMinMax, clipPolyline, clipPolygon, joinPolylines
+from .paths import simplifyPolyline
+from .paths import monotonicDirection, steppedVertices, appendPath, strokePath
 
 
 class RectDataHolder(DataHolder):
+    """A DataHolder with X and Y axes that can be mapped onto a RectField.
+
+    The results of getMapped() and getAllMapped() are cached, keyed on the
+    state of the transformer used (see RectField.Transformer.cacheKey), so
+    that a painter and its stamps share one mapping and redraws with
+    unchanged bounds don't redo it. Only unclamped mappings are stored;
+    those for weakly clamping transformers are derived from them, so that
+    lines (drawn unclamped) and stamps (drawn clamped) share an entry. The
+    cached arrays are read-only. The cache is dropped whenever the data
+    are set or added to; call dataChanged() after modifying data arrays in
+    place, as is possible when they were given with copy=False. Set
+    cacheMapped to False to disable the cache. Mappings for up to
+    maxCachedTransforms different transformers are kept.
+    """
+
     AxisX = 2
     AxisY = 3
 
+    cacheMapped = True
+    maxCachedTransforms = 4
+    _mappedCache = None
+
     def __init__(self, xtype, ytype):
         self.axistypes += (xtype, ytype)
 
-    def getMapped(self, cinfo, xform):
-        imisc, fmisc, x, y = self.get(cinfo)
+    def dataChanged(self):
+        """Forget any cached mapped coordinates."""
+        self._mappedCache = None
+
+    def _setGeneric(self, type, dtype, arrays, copy):
+        self.dataChanged()
+        return super(RectDataHolder, self)._setGeneric(type, dtype, arrays, copy)
+
+    def _cachedMapping(self, cinfo, xform, getData):
+        compute = lambda: self._mapAll(xform, getData())
+
+        if not self.cacheMapped:
+            return compute()
+
+        if xform.weakClamp:
+            imisc, fmisc, x, y = self._cachedMapping(cinfo, xform.unclamped(), getData)
+            return imisc, fmisc, xform.clampX(x), xform.clampY(y)
+
+        xkey = xform.cacheKey()
+
+        if xkey is None:
+            return compute()
+
+        if self._mappedCache is None:
+            self._mappedCache = OrderedDict()
+
+        entries = self._mappedCache.get(xkey)
+
+        if entries is None:
+            entries = self._mappedCache[xkey] = {}
+
+            while len(self._mappedCache) > self.maxCachedTransforms:
+                self._mappedCache.popitem(last=False)
+        else:
+            self._mappedCache.move_to_end(xkey)
+
+        result = entries.get(cinfo)
+
+        if result is None:
+            result = compute()
+
+            for a in result[2:]:
+                a.flags.writeable = False
+
+            entries[cinfo] = result
+
+        return result
+
+    def _mapAll(self, xform, data):
+        imisc, fmisc, x, y = data
         x = xform.mapX(x)
         y = xform.mapY(y)
         return imisc, fmisc, x, y
 
+    def getMapped(self, cinfo, xform):
+        return self._cachedMapping(cinfo, xform, lambda: self.get(cinfo))
+
     def getAllMapped(self, xform):
-        imisc, fmisc, x, y = self.getAll()
-        x = xform.mapX(x)
-        y = xform.mapY(y)
-        return imisc, fmisc, x, y
+        return self._cachedMapping(None, xform, self.getAll)
 
     def getMappedXY(self, cinfo, xform):
-        imisc, fmisc, x, y = self.get(cinfo)
-        return xform.mapX(x[0]), xform.mapY(y[0])
+        imisc, fmisc, x, y = self.getMapped(cinfo, xform)
+        return x[0], y[0]
 
     def getRawXY(self, cinfo):
         imisc, fmisc, x, y = self.get(cinfo)
         return x[0], y[0]
 
+    def iterAllMapped(self, xform):
+        """Iterate over the results of getAllMapped() in chunks of rows.
+        Successive chunks overlap by one row, so that polylines drawn from
+        them join up. The base implementation yields a single chunk."""
+
+        yield self.getAllMapped(xform)
+
+    def getDataBounds(self):
+        """Return (xmin, xmax, ymin, ymax) over all of the X and Y columns,
+        or four Nones if there are no data."""
+
+        imisc, fmisc, xs, ys = self.getAll()
+
+        if xs.shape[1] < 1:
+            return (None, None, None, None)
+
+        return xs.min(), xs.max(), ys.min(), ys.max()
+
+
+class _GrowableColumns(object):
+    """Storage for the int or float columns of an AppendableRectDataHolder.
+
+    Rows are appended to a buffer that doubles in size when it fills
+    up. In ring mode, the buffer holds two mirrored copies of a fixed
+    number of rows, so that the most recent rows are always contiguous
+    no matter where the ring wraps. Running per-column minima and maxima
+    are kept up to date as rows come and go."""
+
+    def __init__(self, width, dtype, capacity):
+        self.width = width
+        self.dtype = dtype
+        self.capacity = capacity
+        self.head = 0
+        self.count = 0
+
+        if capacity is None:
+            self.buf = np.empty((width, 16), dtype=dtype)
+        else:
+            self.buf = np.empty((width, 2 * capacity), dtype=dtype)
+
+        self.cmin = np.empty(width, dtype=dtype)
+        self.cmax = np.empty(width, dtype=dtype)
+        self.stale = np.zeros(width, dtype=bool)
+
+    def view(self):
+        return self.buf[:, self.head : self.head + self.count]
+
+    def extend(self, block):
+        k = block.shape[1]
+
+        if k == 0:
+            return
+
+        cap = self.capacity
+
+        if cap is not None and k > cap:
+            # Only the last rows of an oversized block survive; the rest
+            # mustn't count towards the bounds.
+            block = block[:, -cap:]
+            k = cap
+
+        if self.count == 0:
+            self.cmin[:] = block.min(axis=1)
+            self.cmax[:] = block.max(axis=1)
+            self.stale[:] = False
+        else:
+            self.cmin[:] = np.minimum(self.cmin, block.min(axis=1))
+            self.cmax[:] = np.maximum(self.cmax, block.max(axis=1))
+
+        if self.capacity is None:
+            n = self.count + k
+
+            if n > self.buf.shape[1]:
+                newbuf = np.empty(
+                    (self.width, max(n, 2 * self.buf.shape[1])), self.dtype
+                )
+                newbuf[:, : self.count] = self.buf[:, : self.count]
+                self.buf = newbuf
+
+            self.buf[:, self.count : n] = block
+            self.count = n
+            return
+
+        nevict = max(self.count + k - cap, 0)
+
+        if nevict:
+            # If an evicted row holds a column's extreme value, the running
+            # bound has to be recomputed from the rows that remain.
+            old = self.buf[:, self.head : self.head + nevict]
+            self.stale |= (old.min(axis=1) <= self.cmin) | (
+                old.max(axis=1) >= self.cmax
+            )
+
+        pos = (self.head + self.count + np.arange(k)) % cap
+        self.buf[:, pos] = block
+        self.buf[:, pos + cap] = block
+        self.count += k
+
+        if self.count > cap:
+            self.head = (self.head + self.count - cap) % cap
+            self.count = cap
+
+    def bounds(self, start, stop):
+        if self.stale[start:stop].any():
+            v = self.view()
+            self.cmin[:] = v.min(axis=1)
+            self.cmax[:] = v.max(axis=1)
+            self.stale[:] = False
+
+        return self.cmin[start:stop].min(), self.cmax[start:stop].max()
+
+
+class RawColumnLayout(object):
+    """Describes how columns of numbers are laid out in a raw binary file,
+    so that the file can be memory-mapped by a MemmapRectDataHolder.
+
+    - dtype: the Numpy datatype of the values
+    - ncols: the number of columns in the file
+    - interleaved: if True (the default), the file is a sequence of
+      records each holding one value of every column; if False, it holds
+      all the values of the first column, then all of the second, etc.
+    - offset: the number of header bytes to skip at the start of the file
+    """
+
+    def __init__(self, dtype, ncols, interleaved=True, offset=0):
+        self.dtype = np.dtype(dtype)
+        self.ncols = int(ncols)
+        self.interleaved = interleaved
+        self.offset = int(offset)
+
+    def open(self, filename):
+        """Map @filename read-only, returning a (ncols, n) array."""
+
+        flat = np.memmap(filename, dtype=self.dtype, mode="r", offset=self.offset)
+
+        if flat.size % self.ncols != 0:
+            raise ValueError(
+                "size of %s is not a multiple of %d columns" % (filename, self.ncols)
+            )
+
+        if self.interleaved:
+            return flat.reshape((-1, self.ncols)).T
+        return flat.reshape((self.ncols, -1))
+
+
+class MemmapRectDataHolder(RectDataHolder):
+    """A RectDataHolder for data sets too big to load into memory.
+
+    The data are given with mapInts() and mapFloats(), which take the
+    same arguments as setInts() and setFloats() except that each one may
+    also be the name of a .npy file, or a (filename, RawColumnLayout)
+    tuple for a raw binary file. Files are memory-mapped read-only and
+    the data are never copied as a whole, even if they are not stored
+    as float64; as with setFloats(..., copy=False), 1D inputs are single
+    columns and 2D ones have shape (ncols, n).
+
+    Data bounds and mapped coordinates are computed in chunks of
+    "chunkSize" rows, so that the temporaries needed are bounded. Only
+    iterAllMapped() is bounded overall, though, since it maps one chunk
+    at a time: it is what XYDataPainter uses to draw lines. getMapped()
+    and getAllMapped() still return full-length arrays of mapped values,
+    so painters that use them -- stamps, and the stepped, histogram,
+    envelope and polygon painters -- need memory proportional to the
+    whole data set. Draw large data sets with XYDataPainter lines only.
+    """
+
+    copyData = False
+    cacheMapped = False
+    chunkSize = 1048576
+
+    def _open(self, source):
+        if isinstance(source, str):
+            return np.load(source, mmap_mode="r")
+        if isinstance(source, tuple):
+            filename, layout = source
+            return layout.open(filename)
+        return source
+
+    def _usableAsIs(self, type, dtype, array):
+        if type == self.AxisTypeInt:
+            return array.dtype.kind in "ib"
+        return array.dtype.kind == "f"
+
+    def mapInts(self, *sources):
+        return self.setInts(*[self._open(s) for s in sources], copy=False)
+
+    def mapFloats(self, *sources):
+        return self.setFloats(*[self._open(s) for s in sources], copy=False)
+
+    def _mapChunked(self, func, values):
+        out = None
+        step = self.chunkSize
+
+        for start in range(0, values.shape[1], step):
+            chunk = func(values[:, start : start + step])
+
+            if out is None:
+                out = np.empty(values.shape, dtype=chunk.dtype)
+
+            out[:, start : start + step] = chunk
+
+        if out is None:
+            return np.zeros(values.shape)
+        return out
+
+    def getMapped(self, cinfo, xform):
+        imisc, fmisc, x, y = self.get(cinfo)
+        x = self._mapChunked(xform.mapX, x)
+        y = self._mapChunked(xform.mapY, y)
+        return imisc, fmisc, x, y
+
+    def getAllMapped(self, xform):
+        imisc, fmisc, x, y = self.getAll()
+        x = self._mapChunked(xform.mapX, x)
+        y = self._mapChunked(xform.mapY, y)
+        return imisc, fmisc, x, y
+
+    def getMappedXY(self, cinfo, xform):
+        imisc, fmisc, x, y = self.get(cinfo)
+        return (
+            self._mapChunked(xform.mapX, x[:1])[0],
+            self._mapChunked(xform.mapY, y[:1])[0],
+        )
+
+    def iterAllMapped(self, xform):
+        imisc, fmisc, x, y = self.getAll()
+        step = self.chunkSize
+        n = x.shape[1]
+
+        for start in range(0, max(n - 1, 1), step):
+            s = slice(start, start + step + 1)
+            yield imisc[:, s], fmisc[:, s], xform.mapX(x[:, s]), xform.mapY(y[:, s])
+
+    def getDataBounds(self):
+        imisc, fmisc, xs, ys = self.getAll()
+        n = xs.shape[1]
+
+        if n < 1:
+            return (None, None, None, None)
+
+        bounds = []
+
+        for v in (xs, ys):
+            mins = []
+            maxs = []
+
+            for start in range(0, n, self.chunkSize):
+                chunk = v[:, start : start + self.chunkSize]
+                mins.append(chunk.min())
+                maxs.append(chunk.max())
+
+            bounds += [min(mins), max(maxs)]
+
+        return tuple(bounds)
+
+
+class AppendableRectDataHolder(RectDataHolder):
+    """A RectDataHolder that can be added to after its data have been set,
+    for plots of live data streams.
+
+    Consumers are registered as usual. Data may then be added with
+    extendInts() and extendFloats(), which take arguments just like
+    setInts() and setFloats() but add the rows to the end of the existing
+    data instead of replacing them, or with appendInts() and
+    appendFloats(), which take the values of a single row. Appending is
+    amortized O(1) per row. If every column of one type is given, the
+    matching columns of the other type must be given too before the
+    data are next used.
+
+    If @capacity is given, the holder is a ring buffer that keeps only
+    the most recent @capacity rows, silently dropping the oldest ones.
+
+    The bounds of the X and Y data are tracked as rows are added, so
+    getDataBounds() does not rescan the data. Float data are always
+    stored in double precision, whatever the floatType, since the range
+    of values to come isn't known in advance.
+    """
+
+    def __init__(self, xtype, ytype, capacity=None):
+        super(AppendableRectDataHolder, self).__init__(xtype, ytype)
+        self.capacity = capacity
+        self._stores = {}
+
+    def _store(self, type):
+        store = self._stores.get(type)
+
+        if store is None:
+            totw = 0
+
+            for atype, w in zip(self.axistypes, self.allocations):
+                if atype == type:
+                    totw += w
+
+            dtype = int if type == self.AxisTypeInt else float
+            store = self._stores[type] = _GrowableColumns(totw, dtype, self.capacity)
+
+        return store
+
+    def _publish(self, type):
+        store = self._stores[type]
+
+        if store.width == 0:
+            return
+
+        v = _ColumnBlocks([store.view()], store.count, True)
+
+        if type == self.AxisTypeInt:
+            self.intdata = v
+        else:
+            self.fltdata = v
+
+        self.dlen = store.count
+
+    def _checkLengths(self):
+        # A holder that hasn't been given any rows yet is just empty.
+        if self.intdata is None and self.fltdata is None and self.allocations:
+            for type in (self.AxisTypeInt, self.AxisTypeFloat):
+                self._store(type)
+                self._publish(type)
+
+        super(AppendableRectDataHolder, self)._checkLengths()
+
+    def _extendGeneric(self, type, args):
+        if self.allocations is None:
+            raise Exception("Need to register consumers before adding data")
+
+        store = self._store(type)
+        blocks = []
+        l = -1
+
+        for a in args:
+            a = np.asarray(a)
+
+            if a.ndim == 1:
+                a = a[np.newaxis, :]
+            elif a.ndim != 2:
+                raise Exception("Expect 1- or 2-D arrays only")
+
+            if type == self.AxisTypeInt and a.dtype.kind not in "ib":
+                raise Exception("Need to pass ints to for int data (%s)" % a.dtype)
+
+            if l < 0:
+                l = a.shape[1]
+            elif a.shape[1] != l:
+                raise Exception("Expect same-length arrays")
+
+            blocks.append(a)
+
+        if sum(b.shape[0] for b in blocks) != store.width:
+            raise Exception("Need to give exactly %d columns of data" % store.width)
+
+        if len(blocks) == 1:
+            block = blocks[0]
+        else:
+            block = np.concatenate(blocks)
+
+        store.extend(block.astype(store.dtype, copy=False))
+        self.dataChanged()
+        self._publish(type)
+        return self
+
+    def _setGeneric(self, type, dtype, arrays, copy):
+        self._stores.pop(type, None)
+        self._extendGeneric(type, arrays)
+
+        if type == self.AxisTypeInt:
+            return self.intdata
+        return self.fltdata
+
+    def extendInts(self, *args):
+        """Add rows of integer data; arguments are as for setInts()."""
+        return self._extendGeneric(self.AxisTypeInt, args)
+
+    def extendFloats(self, *args):
+        """Add rows of float data; arguments are as for setFloats()."""
+        return self._extendGeneric(self.AxisTypeFloat, args)
+
+    def appendInts(self, *values):
+        """Add one row of integer data. Each argument is a scalar or a 1D
+        array giving the values of one or more consecutive columns."""
+        return self.extendInts(*[np.reshape(v, (-1, 1)) for v in values])
+
+    def appendFloats(self, *values):
+        """Add one row of float data, analogously to appendInts()."""
+        return self.extendFloats(*[np.reshape(v, (-1, 1)) for v in values])
+
+    def _axisColumns(self, axis):
+        type = self.axistypes[axis]
+        start = 0
+
+        for i in range(axis):
+            if self.axistypes[i] == type:
+                start += self.allocations[i]
+
+        return type, start, start + self.allocations[axis]
+
+    def getDataBounds(self):
+        bounds = ()
+
+        for axis in (self.AxisX, self.AxisY):
+            type, start, stop = self._axisColumns(axis)
+            store = self._stores.get(type)
+
+            if store is None or store.count == 0 or start == stop:
+                return (None, None, None, None)
+
+            bounds += store.bounds(start, stop)
+
+        return bounds
+
+    def exportIface(self, other):
+        super(AppendableRectDataHolder, self).exportIface(other)
+        other.extendInts = self.extendInts
+        other.extendFloats = self.extendFloats
+        other.appendInts = self.appendInts
+        other.appendFloats = self.appendFloats
+        return self
+
+
+def _mappingValues(values, lo, hi):
+    """Prepare @values for mapping onto an axis running from @lo to @hi,
+    returning (values, lo, hi). Single-precision arrays are kept in single
+    precision unless the axis is offset so far from zero, relative to its
+    span, that the results would visibly lose precision; then they are
+    promoted to float64. Everything else passes through unchanged."""
+
+    if isinstance(values, np.ndarray) and values.dtype == np.float32:
+        if _float32Suffices(lo, hi):
+            return values, np.float32(lo), np.float32(hi)
+        return values.astype(np.float64), lo, hi
+
+    return values, lo, hi
+
 
 class RectAxis(object):
     """Generic class for a logical axis on a rectangular plot. Note that
@@ -85,6 +591,12 @@ class RectAxis(object):
             self.reverse = True
             self.min, self.max = self.max, self.min
 
+    def cacheKey(self):
+        """Return a hashable value that changes whenever the results of
+        transform() might, or None if no such value is known, in which
+        case mapped coordinates are never cached."""
+        return None
+
 
 class LinearAxis(RectAxis):
     """A linear logical axis for a rectangular plot."""
@@ -94,10 +606,15 @@ class LinearAxis(RectAxis):
         self.max = max
 
     def transform(self, values):
+        values, lo, hi = _mappingValues(values, self.min, self.max)
+
         # The +0 forces floating-point evaluation.
         if self.reverse:
-            return (self.max - (values + 0.0)) / (self.max - self.min)
-        return (values + 0.0 - self.min) / (self.max - self.min)
+            return (hi - (values + 0.0)) / (hi - lo)
+        return (values + 0.0 - lo) / (hi - lo)
+
+    def cacheKey(self):
+        return (LinearAxis, self.min, self.max, self.reverse)
 
     def inbounds(self, values):
         return np.logical_and(values >= self.min, values <= self.max)
@@ -142,11 +659,13 @@ class LogarithmicAxis(RectAxis):
             return np.zeros_like(values)
 
         valid = values > 0
-        vc = np.where(valid, values, 1)
+        vc = np.log10(np.where(valid, values, 1))
+        vc, lo, hi = _mappingValues(vc, self.logmin, self.logmax)
 
         if self.reverse:
-            ret = (self.logmax - np.log10(vc)) / (self.logmax - self.logmin)
-        ret = (np.log10(vc) - self.logmin) / (self.logmax - self.logmin)
+            ret = (hi - vc) / (hi - lo)
+        else:
+            ret = (vc - lo) / (hi - lo)
 
         # For zero or negative values, return something very small and
         # smaller than the smallest valid value, to preserve ordering
@@ -154,6 +673,9 @@ class LogarithmicAxis(RectAxis):
         # with out-of-bounds values on log axes.
         return np.where(valid, ret, min(-10, ret.min() - 1))
 
+    def cacheKey(self):
+        return (LogarithmicAxis, self.logmin, self.logmax, self.reverse)
+
     def inbounds(self, values):
         valid = values > 0
         vc = np.where(valid, values, 1)
@@ -864,12 +1386,19 @@ class RectField(object):
         the RectField's X axis.
 
         - mapY (val): Analogous to transformX.
+
+        - cacheKey (): A hashable summary of the mapping, or None.
+
+        - unclamped (), clampX (mapped), clampY (mapped): The equivalent
+        transformer without weak clamping, and functions that apply this
+        one's clamping to values that it has mapped.
         """
 
         def __init__(self, field, width, height, weakClamp):
             self.field = field
             self.width = float(width)
             self.height = float(height)
+            self.weakClamp = bool(weakClamp)
 
             if weakClamp:
                 self.mapX = self._mapX_weakClamp
@@ -878,6 +1407,30 @@ class RectField(object):
                 self.mapX = self._mapX_raw
                 self.mapY = self._mapY_raw
 
+        def cacheKey(self):
+            xkey = self.field.xaxis.cacheKey()
+            ykey = self.field.yaxis.cacheKey()
+
+            if xkey is None or ykey is None:
+                return None
+
+            return (xkey, ykey, self.width, self.height, self.weakClamp)
+
+        def unclamped(self):
+            if not self.weakClamp:
+                return self
+            return self.field.makeTransformer(self.width, self.height, False)
+
+        def clampX(self, mapped):
+            if not self.weakClamp:
+                return mapped
+            return np.clip(mapped, -self.width, 2 * self.width)
+
+        def clampY(self, mapped):
+            if not self.weakClamp:
+                return mapped
+            return np.clip(mapped, -self.height, 2 * self.height)
+
         def _mapX_raw(self, val):
             return self.field.xaxis.transform(val) * self.width
 
@@ -889,15 +1442,11 @@ class RectField(object):
             return (1.0 - self.field.yaxis.transform(val)) * self.height
 
         def _mapX_weakClamp(self, val):
-            raw = self.field.xaxis.transform(val)
-            np.clip(raw, -1.0, 2.0)
-
+            raw = np.clip(self.field.xaxis.transform(val), -1.0, 2.0)
             return raw * self.width
 
         def _mapY_weakClamp(self, val):
-            raw = 1.0 - self.field.yaxis.transform(val)
-            np.clip(raw, -1.0, 2.0)
-
+            raw = np.clip(1.0 - self.field.yaxis.transform(val), -1.0, 2.0)
             return raw * self.height
 
     def makeTransformer(self, width, height, weakClamp):
@@ -1793,6 +2342,16 @@ class FieldPainter(Painter):
             raise Exception("Need to set field of FieldPainter before painting!")
 
         self.xform = self.field.makeTransformer(self.fullw, self.fullh, True)
+        self.rawxform = self.field.makeTransformer(self.fullw, self.fullh, False)
+
+    def _visibleBounds(self, ctxt):
+        """Return (xmin, xmax, ymin, ymax) of the region in which geometry
+        stroked with the current line settings of @ctxt can show up in the
+        field. Lines should be mapped with self.rawxform and clipped to
+        this region."""
+
+        pad = 0.5 * ctxt.get_line_width() * max(ctxt.get_miter_limit(), 1.0)
+        return -pad, self.fullw + pad, -pad, self.fullh + pad
 
     def setBounds(self, *args):
         self.field.setBounds(*args)
@@ -2003,18 +2562,56 @@ class RegionKeyPainter(GenericDataKeyPainter):
         self.ts.paintAt(ctxt, self.border[3], ty, tc)
 
 
+def _strokePolyline(ctxt, x, y):
+    """Stroke a polyline whose runs are separated by NaN vertices, as
+    returned by clipPolyline(). The path is stroked every 100 vertices so
+    that it never gets too long."""
+
+    ctxt.new_path()
+    strokePath(ctxt, np.column_stack((x, y)))
+
+
 class XYDataPainter(FieldPainter):
+    """Paints XY data as a line and/or with a stamp at each point.
+
+    The line path can be decimated before it is handed to Cairo: each
+    device pixel column is reduced to its first, minimum, maximum, and
+    last samples, which looks the same as drawing every sample. The
+    "decimate" attribute controls this. If None (the default), the line
+    is decimated when painting to bitmap targets (PNG, on-screen
+    display) and drawn exactly when painting to vector targets (PDF,
+    PS, SVG). True or False force the choice.
+
+    The line can also be simplified with the Douglas-Peucker algorithm,
+    which drops vertices so long as the line moves by no more than
+    "simplifyTolerance" (in units of style.smallScale). This is off by
+    default, since it is not exact, but it can shrink vector output
+    considerably. After each paint, "nDropped" gives the number of
+    samples that were left out by either reduction.
+
+    By default the painter stores its data in a new RectDataHolder. A
+    different one, such as an AppendableRectDataHolder for streaming
+    data, can be passed as @data; it must not have any consumers
+    registered yet.
+    """
+
     lineStyle = None
     stampStyle = None
     needsDataStyle = True
     dsn = None
     lines = True
     pointStamp = None
+    decimate = None
+    simplifyTolerance = None
+    nDropped = 0
 
-    def __init__(self, lines=True, pointStamp=None, keyText="Data"):
+    def __init__(self, lines=True, pointStamp=None, keyText="Data", data=None):
         super(XYDataPainter, self).__init__()
 
-        self.data = RectDataHolder(DataHolder.AxisTypeFloat, DataHolder.AxisTypeFloat)
+        if data is None:
+            data = RectDataHolder(DataHolder.AxisTypeFloat, DataHolder.AxisTypeFloat)
+
+        self.data = data
         self.data.exportIface(self)
         self.cinfo = self.data.register(0, 0, 1, 1)
 
@@ -2030,12 +2627,7 @@ class XYDataPainter(FieldPainter):
         self.keyText = keyText
 
     def getDataBounds(self):
-        ign, ign, xs, ys = self.data.getAll()
-
-        if xs.shape[1] < 1:
-            return (None, None, None, None)
-
-        return xs.min(), xs.max(), ys.min(), ys.max()
+        return self.data.getDataBounds()
 
     def getKeyPainter(self):
         if self.keyText is None:
@@ -2043,10 +2635,23 @@ class XYDataPainter(FieldPainter):
 
         return XYKeyPainter(self)
 
+    def _shouldDecimate(self, ctxt, npts):
+        decimate = self.decimate
+
+        if decimate is None:
+            decimate = not _isVectorTarget(ctxt)
+
+        if not decimate:
+            return False
+
+        # Not worth it unless there are several samples per pixel column.
+        ncols = self.xform.width / _deviceColumnWidth(ctxt)
+        return npts > 4 * ncols
+
     def doPaint(self, ctxt, style):
         super(XYDataPainter, self).doPaint(ctxt, style)
 
-        imisc, fmisc, allx, ally = self.data.getAllMapped(self.xform)
+        ign, ign, allx, ign = self.data.getAll()
 
         if allx.shape[1] < 1:
             return
@@ -2055,19 +2660,32 @@ class XYDataPainter(FieldPainter):
         style.applyDataLine(ctxt, self.dsn)
         style.apply(ctxt, self.lineStyle)
 
-        x, y = allx[0, :], ally[0, :]
-
-        ctxt.move_to(x[0], y[0])
+        self.nDropped = 0
 
         if self.lines:
-            for i in range(1, x.size):
-                ctxt.line_to(x[i], y[i])
+            bounds = self._visibleBounds(ctxt)
+            decimate = self._shouldDecimate(ctxt, allx.shape[1])
+            colwidth = _deviceColumnWidth(ctxt)
+            tolerance = (self.simplifyTolerance or 0) * style.smallScale
+            pieces = []
 
-                if i > 0 and i % 100 == 0:
-                    ctxt.stroke()
-                    ctxt.move_to(x[i], y[i])
+            # Large holders hand the data over in chunks, so that only the
+            # visible and decimated vertices of each are kept around.
 
-            ctxt.stroke()
+            for ign, ign, cx, cy in self.data.iterAllMapped(self.rawxform):
+                x, y = clipPolyline(cx[0], cy[0], *bounds)
+
+                if decimate:
+                    x, y, ndropped = decimateMinMax(x, y, colwidth)
+                    self.nDropped += ndropped
+
+                if tolerance > 0:
+                    x, y, ndropped = simplifyPolyline(x, y, tolerance)
+                    self.nDropped += ndropped
+
+                pieces.append((x, y))
+
+            _strokePolyline(ctxt, *joinPolylines(pieces))
 
         ctxt.restore()
 
@@ -2088,6 +2706,9 @@ class ContinuousSteppedPainter(FieldPainter):
     Nth bin. The final Y value is ignored.
 
     X values must be sorted, but may be either increasing or decreasing.
+
+    The data are stored in a new RectDataHolder unless a different one,
+    such as a MemmapRectDataHolder, is passed as @data.
     """
 
     lineStyle = None
@@ -2095,14 +2716,17 @@ class ContinuousSteppedPainter(FieldPainter):
     dsn = None
     connectors = True
 
-    def __init__(self, lineStyle=None, connectors=True, keyText="Histogram"):
+    def __init__(self, lineStyle=None, connectors=True, keyText="Histogram", data=None):
         super(ContinuousSteppedPainter, self).__init__()
 
         self.lineStyle = lineStyle
         self.connectors = connectors
         self.keyText = keyText
 
-        self.data = RectDataHolder(DataHolder.AxisTypeFloat, DataHolder.AxisTypeFloat)
+        if data is None:
+            data = RectDataHolder(DataHolder.AxisTypeFloat, DataHolder.AxisTypeFloat)
+
+        self.data = data
         self.data.exportIface(self)
         self.cinfo = self.data.register(0, 0, 1, 1)
 
@@ -2116,8 +2740,7 @@ class ContinuousSteppedPainter(FieldPainter):
                 % (yvals.size, yvals.size + 1, edges.size)
             )
 
-        deltas = edges[1:] - edges[:-1]
-        if np.any(deltas > 0) and np.any(deltas < 0):
+        if monotonicDirection(edges) is None:
             raise ValueError("bin edges are not sorted")
 
         self.setFloats(edges, np.concatenate((yvals, [0])))
@@ -2171,51 +2794,30 @@ class ContinuousSteppedPainter(FieldPainter):
         style.applyDataLine(ctxt, self.dsn)
         style.apply(ctxt, self.lineStyle)
 
-        prevx, prevy = xs[0], ys[0]
-        ctxt.move_to(prevx, prevy)
-        cmpval = None
+        # Only draw the bins that overlap the field, plus one on either
+        # side so that the joins at its edges come out right.
 
-        def mycmp(a, b):  # Python 3 removed cmp()
-            a = float(a)  # Numpy floats yield numpy bools which don't subtract
-            b = float(b)
-            return (a > b) - (a < b)
+        xmin, xmax, ign, ign = self._visibleBounds(ctxt)
+        lo = np.minimum(xs[:-1], xs[1:])
+        hi = np.maximum(xs[:-1], xs[1:])
+        vis = np.flatnonzero((hi >= xmin) & (lo <= xmax))
+
+        if vis.size == 0:
+            return
+
+        start = max(vis[0] - 1, 0)
+        stop = min(vis[-1] + 3, xs.size)
+        xs, ys = xs[start:stop], ys[start:stop]
+
+        if monotonicDirection(xs) is None:
+            raise Exception("arguments must be sorted in X")
 
         if self.connectors:
-            for i in range(1, xs.size - 1):
-                x, y = xs[i], ys[i]
-
-                c = mycmp(x, prevx)
-                if cmpval is None and c != 0:
-                    cmpval = c
-                elif c != cmpval and c != 0:
-                    raise Exception(
-                        "arguments must be sorted in X (%s %s %s %s)"
-                        % (prevx, x, cmpval, c)
-                    )
-
-                ctxt.line_to(x, prevy)
-                ctxt.line_to(x, y)
-                prevx, prevy = x, y
+            breaks = None
         else:
-            for i in range(1, xs.size - 1):
-                x, y = xs[i], ys[i]
-
-                c = mycmp(x, prevx)
-                if cmpval is None and c != 0:
-                    cmpval = c
-                elif c != cmpval and c != 0:
-                    raise Exception(
-                        "arguments must be sorted in X (%s %s %s %s)"
-                        % (prevx, x, cmpval, c)
-                    )
-
-                ctxt.line_to(x, prevy)
-                ctxt.stroke()
-                ctxt.move_to(x, y)
-                prevx, prevy = x, y
-
-        ctxt.line_to(xs[-1], prevy)
-        ctxt.stroke()
+            breaks = np.ones(xs.size - 1, dtype=bool)
+
+        _strokePolyline(ctxt, *steppedVertices(xs[:-1], xs[1:], ys[:-1], breaks))
 
 
 class FilledHistogram(FieldPainter):
@@ -2244,8 +2846,7 @@ class FilledHistogram(FieldPainter):
                 % (values.size, values.size + 1, edges.size)
             )
 
-        deltas = edges[1:] - edges[:-1]
-        if np.any(deltas > 0) and np.any(deltas < 0):
+        if monotonicDirection(edges) is None:
             raise ValueError("bin edges are not sorted")
 
         self.setFloats(edges, np.concatenate((values, [0])))
@@ -2267,61 +2868,60 @@ class FilledHistogram(FieldPainter):
         x, y = x[0], y[0]
         yzero = self.xform.mapY(0)
 
-        ctxt.save()
-        style.apply(ctxt, self.style)
+        if x.size < 2:
+            return
 
-        ctxt.move_to(x[0], yzero)
+        if monotonicDirection(x) not in (0, 1):
+            raise RuntimeError("x values must be sorted")
 
-        for i in range(1, y.size):
-            if x[i] < x[i - 1]:
-                raise RuntimeError("x values must be sorted")
-            ctxt.line_to(x[i - 1], y[i - 1])
-            ctxt.line_to(x[i], y[i - 1])
+        sx, sy = steppedVertices(x[:-1], x[1:], y[:-1])
 
-        ctxt.line_to(x[i], yzero)
-        ctxt.close_path()
+        ctxt.save()
+        style.apply(ctxt, self.style)
+
+        ctxt.new_path()
+        appendPath(
+            ctxt,
+            np.column_stack(
+                (
+                    np.concatenate(([x[0]], sx, [x[-1]])),
+                    np.concatenate(([yzero], sy, [yzero])),
+                )
+            ),
+            close=True,
+        )
         ctxt.fill()
         ctxt.restore()
 
 
 def _paintSteppedLines(ctxt, xls, xrs, ys, connectors):
-    n = ys.size
+    if ys.size == 0:
+        return
 
     if not connectors:
-        for i in range(n):
-            ctxt.move_to(xls[i], ys[i])
-            ctxt.line_to(xrs[i], ys[i])
-            ctxt.stroke()
+        breaks = np.ones(ys.size, dtype=bool)
     else:
-        prevxr = None
+        prevxr = xrs[:-1]
+        xl = xls[1:]
 
-        for i in range(n):
-            xl = xls[i]
-            xr = xrs[i]
-            y = ys[i]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rel = (prevxr - xl) / np.abs(xl)
 
-            if prevxr is not None and (prevxr - xl) / abs(xl) > 1e-6:
-                raise Exception(
-                    "Arguments must be sorted in X when using connectors "
-                    "(%f, %f, %f)" % (prevxr, xl, xl - prevxr)
-                )
+        bad = np.flatnonzero(rel > 1e-6)
 
-            if prevxr is None:
-                ctxt.move_to(xl, y)
-            elif abs((prevxr - xl) / xl) < 0.01:
-                # Connector line would be vertical like we'd hope,
-                # continue making the path
-                ctxt.line_to(xl, y)
-            else:
-                # We've jumped in the X domain, so we'll start a
-                # new line
-                ctxt.stroke()
-                ctxt.move_to(xl, y)
+        if bad.size:
+            i = bad[0]
+            raise Exception(
+                "Arguments must be sorted in X when using connectors "
+                "(%f, %f, %f)" % (prevxr[i], xl[i], xl[i] - prevxr[i])
+            )
 
-            ctxt.line_to(xr, y)
-            prevxr = xr
+        # Only connect bins if the connector line would be vertical like
+        # we'd hope; otherwise we've jumped in the X domain and start a
+        # new line.
+        breaks = np.concatenate(([False], ~(np.abs(rel) < 0.01)))
 
-        ctxt.stroke()
+    _strokePolyline(ctxt, *steppedVertices(xls, xrs, ys, breaks))
 
 
 class SteppedBoundedPainter(FieldPainter):
@@ -2530,28 +3130,28 @@ class SteppedUpperLimitPainter(FieldPainter):
         hackdx = hacklen * 0.3
         hackdy = hacklen * 0.95
 
-        for i in range(n):
-            xl, xr = xls[i], xrs[i]
-            yul = yuls[i]
-            xmid = 0.5 * (xl + xr)
-            alen = min(abs(yul - yzero), maxlen)
-            alen = max(alen - hackdy, 0)
-            tozerosign = np.sign(yzero - yul)
-            yend = yul + tozerosign * alen
-
-            if alen > 0:
-                # The arrowhead may consume all vertical space, in which case
-                # don't draw the line.
-                ctxt.move_to(xmid, yul)
-                ctxt.line_to(xmid, yend)
-                ctxt.stroke()
-
-            yend += hackdy
-            ctxt.move_to(xmid, yend)
-            ctxt.line_to(xmid + hackdx, yend - hackdy * tozerosign)
-            ctxt.line_to(xmid - hackdx, yend - hackdy * tozerosign)
-            ctxt.close_path()
-            ctxt.fill()
+        xmid = 0.5 * (xls + xrs)
+        alen = np.minimum(np.abs(yuls - yzero), maxlen)
+        alen = np.maximum(alen - hackdy, 0)
+        tozerosign = np.sign(yzero - yuls)
+        yend = yuls + tozerosign * alen
+
+        # The arrowhead may consume all vertical space, in which case
+        # don't draw the line.
+        shaft = alen > 0
+        sx = np.repeat(xmid[shaft], 2)
+        sy = np.column_stack((yuls[shaft], yend[shaft])).ravel()
+        breaks = np.arange(sx.size) % 2 == 0
+        appendPath(ctxt, np.column_stack((sx, sy)), breaks)
+        ctxt.stroke()
+
+        yend = yend + hackdy
+        ybase = yend - hackdy * tozerosign
+        hx = np.column_stack((xmid, xmid + hackdx, xmid - hackdx)).ravel()
+        hy = np.column_stack((yend, ybase, ybase)).ravel()
+        breaks = np.arange(hx.size) % 3 == 0
+        appendPath(ctxt, np.column_stack((hx, hy)), breaks, close=True)
+        ctxt.fill()
 
         ctxt.restore()
 
@@ -2856,24 +3456,20 @@ class VEnvelope(FieldPainter):
     def doPaint(self, ctxt, style):
         super(VEnvelope, self).doPaint(ctxt, style)
 
-        ign, ign, x, ys = self.data.getMapped(self.cinfo, self.xform)
+        ign, ign, x, ys = self.data.getMapped(self.cinfo, self.rawxform)
         x = x[0]
         ylo, yhi = ys
 
+        if np.any(x[1:] < x[:-1]):
+            raise RuntimeError("x values must be sorted")
+
         ctxt.save()
         style.apply(ctxt, self.style)
 
-        ctxt.move_to(x[0], yhi[0])
-
-        for i in range(1, yhi.size):
-            if x[i] < x[i - 1]:
-                raise RuntimeError("x values must be sorted")
-            ctxt.line_to(x[i], yhi[i])
-
-        for i in range(yhi.size - 1, -1, -1):
-            ctxt.line_to(x[i], ylo[i])
-
-        ctxt.close_path()
+        px = np.concatenate((x, x[::-1]))
+        py = np.concatenate((yhi, ylo[::-1]))
+        px, py = clipPolygon(px, py, *self._visibleBounds(ctxt))
+        appendPath(ctxt, np.column_stack((px, py)), close=True)
 
         if self.stroke:
             ctxt.stroke()
@@ -2916,19 +3512,15 @@ class Polygon(FieldPainter):
     def doPaint(self, ctxt, style):
         super(Polygon, self).doPaint(ctxt, style)
 
-        ign, ign, x, y = self.data.getMapped(self.cinfo, self.xform)
+        ign, ign, x, y = self.data.getMapped(self.cinfo, self.rawxform)
         x = x[0]
         y = y[0]
 
         ctxt.save()
         style.apply(ctxt, self.style)
 
-        ctxt.move_to(x[0], y[0])
-
-        for i in range(1, y.size):
-            ctxt.line_to(x[i], y[i])
-
-        ctxt.close_path()
+        x, y = clipPolygon(x, y, *self._visibleBounds(ctxt))
+        appendPath(ctxt, np.column_stack((x, y)), close=True)
 
         if self.stroke:
             ctxt.stroke()
@@ -2939,11 +3531,22 @@ class Polygon(FieldPainter):
 
 
 class GridContours(FieldPainter):
-    """Paint contours computed from gridded data."""
+    """Paint contours computed from gridded data.
+
+    Contours of large grids have far more vertices than can be seen, so
+    they are simplified with the Douglas-Peucker algorithm after being
+    mapped to the output: vertices are dropped so long as the line moves
+    by no more than "simplifyTolerance" (in units of style.smallScale),
+    which by default is well under a pixel. Set it to None or 0 to draw
+    every vertex. After each paint, "nDropped" gives the number of
+    vertices that were left out.
+    """
 
     lineStyle = None
     needsDataStyle = True
     dsn = None
+    simplifyTolerance = 0.1
+    nDropped = 0
 
     def __init__(self, computed=None, lineStyle=None, keyText="Contours"):
         super(GridContours, self).__init__()
@@ -2996,21 +3599,21 @@ class GridContours(FieldPainter):
         style.applyDataLine(ctxt, self.dsn)
         style.apply(ctxt, self.lineStyle)
 
+        bounds = self._visibleBounds(ctxt)
+        tolerance = (self.simplifyTolerance or 0) * style.smallScale
+        self.nDropped = 0
+
         for k, cntrs in self.computed.items():
             for cntr in cntrs:
-                x = self.xform.mapX(cntr[0])
-                y = self.xform.mapY(cntr[1])
-
-                ctxt.move_to(x[0], y[0])
-
-                for i in range(1, x.size):
-                    ctxt.line_to(x[i], y[i])
+                x = self.rawxform.mapX(cntr[0])
+                y = self.rawxform.mapY(cntr[1])
+                x, y = clipPolyline(x, y, *bounds)
 
-                    if i > 0 and i % 100 == 0:
-                        ctxt.stroke()
-                        ctxt.move_to(x[i], y[i])
+                if tolerance > 0:
+                    x, y, ndropped = simplifyPolyline(x, y, tolerance)
+                    self.nDropped += ndropped
 
-                ctxt.stroke()
+                _strokePolyline(ctxt, x, y)
 
         ctxt.restore()
 
@@ -3041,6 +3644,30 @@ class ImagePainter(FieldPainter):
     image: the top left corner of the top left pixel, and the bottom
     right corner of the bottom right pixel -- in other words, the
     coordinates are not those of the relevant pixel centers.
+
+    If "mipmap" is True, large images drawn to bitmap targets are
+    painted from a pyramid of copies, each box-filtered down by a
+    factor of two from the one before: the coarsest level whose pixels
+    are no larger than device pixels is used. This is much faster
+    than resampling the full image on every paint, and it antialiases
+    properly. The levels are made as they are needed; if the image
+    data are changed in place, call dataChanged() to discard them.
+
+    Vector targets (PDF, PS, SVG) get the full-resolution image unless
+    "embedDPI" is set, in which case the same pyramid is used to embed
+    the image at no less than that resolution. Cairo stores images in
+    vector files uncompressed or losslessly compressed, but it will
+    embed precompressed data instead if they are attached to the
+    surface. "embedFormat" may be "png" (used by SVG output) or "jpeg"
+    (used by PDF, PS and SVG output; requires PIL, and is only done for
+    opaque images, with quality "embedQuality"). The encoded data are
+    made on first use and kept until the image changes. Bitmap targets
+    are not affected by any of these settings.
+
+    Only the part of the image that can show up in the field is
+    painted, so zooming in on a small part of a big image is cheap:
+    bitmap targets paint from a view of the visible pixels, and vector
+    targets embed a copy of just those pixels.
     """
 
     style = None
@@ -3049,7 +3676,18 @@ class ImagePainter(FieldPainter):
 
     leftx = rightx = None
     topy = bottomy = None
+    surface = None
     pattern = None
+    mipmap = False
+    embedDPI = None
+    embedFormat = None
+    embedQuality = 90
+
+    _format = None
+    _pixels = None
+    _pyramid = None
+    _embedded = None
+    _cropped = None
 
     _dtypes = {
         cairo.FORMAT_RGB24: np.uint32,
@@ -3064,13 +3702,15 @@ class ImagePainter(FieldPainter):
         self.bottomy = float(bottomy)
         return self
 
-    def allocate(self, format, width, height):
-        """Returns an array of shape (height, width). See class docstring."""
+    @classmethod
+    def _createSurface(cls, format, width, height):
+        """Returns (surface, data), where data is the surface's pixel array
+        of shape (height, width)."""
 
-        if format not in self._dtypes:
+        if format not in cls._dtypes:
             raise ValueError("image format not supported")
 
-        dtype = self._dtypes[format]
+        dtype = cls._dtypes[format]
         dsize = dtype().itemsize
         bytestride = cairo.ImageSurface.format_stride_for_width(format, width)
         if bytestride % dsize != 0:
@@ -3078,15 +3718,30 @@ class ImagePainter(FieldPainter):
         itemstride = bytestride // dsize
 
         data = np.empty((height, itemstride), dtype=dtype)
-        self.surface = cairo.ImageSurface.create_for_data(
+        surface = cairo.ImageSurface.create_for_data(
             data, format, width, height, bytestride
         )
+
+        if itemstride == width:
+            return surface, data
+        return surface, data[:, :width]
+
+    def _setSurface(self, format, surface, pixels):
+        self.surface = surface
         self.pattern = cairo.SurfacePattern(self.surface)
         self.pattern.set_filter(cairo.FILTER_NEAREST)
+        self._format = format
+        self._pixels = pixels
+        self._pyramid = None
+        self._embedded = None
+        self._cropped = None
 
-        if itemstride == width:
-            return data
-        return data[:, :width]
+    def allocate(self, format, width, height):
+        """Returns an array of shape (height, width). See class docstring."""
+
+        surface, data = self._createSurface(format, width, height)
+        self._setSurface(format, surface, data)
+        return data
 
     def wrap(self, format, data):
         data = np.atleast_2d(data)
@@ -3104,13 +3759,219 @@ class ImagePainter(FieldPainter):
         if data.strides[0] != bytestride:
             raise ValueError("stride of data array not correct for this format")
 
-        self.surface = cairo.ImageSurface.create_for_data(
+        surface = cairo.ImageSurface.create_for_data(
             data, format, width, height, bytestride
         )
-        self.pattern = cairo.SurfacePattern(self.surface)
-        self.pattern.set_filter(cairo.FILTER_NEAREST)
+        self._setSurface(format, surface, data)
         return self
 
+    def dataChanged(self):
+        """Discard the mipmap levels and embedding data after the image
+        data have been modified."""
+        self._pyramid = None
+        self._embedded = None
+        self._cropped = None
+
+        if self.surface is not None:
+            # This also detaches any MIME data.
+            self.surface.mark_dirty()
+
+    def _mipmapLevel(self, level):
+        """Return the pattern for a level of the pyramid, each of whose
+        pixels covers 2**level pixels of the original image on a side,
+        making it and those below it if need be."""
+
+        if self._pyramid is None:
+            self._pyramid = [(self.pattern, self._pixels)]
+
+        while len(self._pyramid) <= level:
+            prev = self._pyramid[-1][1]
+
+            # Average each 2x2 block channel by channel, which is right
+            # for premultiplied ARGB. Odd edges are padded by repetition.
+
+            chans = prev[..., None].view(np.uint8)
+            h, w = prev.shape
+            chans = np.pad(chans, ((0, h % 2), (0, w % 2), (0, 0)), mode="edge")
+            acc = chans[0::2, 0::2].astype(np.uint16)
+            acc += chans[1::2, 0::2]
+            acc += chans[0::2, 1::2]
+            acc += chans[1::2, 1::2]
+
+            surface, pixels = self._createSurface(
+                self._format, acc.shape[1], acc.shape[0]
+            )
+            pixels[..., None].view(np.uint8)[...] = (acc + 2) >> 2
+            surface.mark_dirty()
+            pattern = cairo.SurfacePattern(surface)
+            pattern.set_filter(self.pattern.get_filter())
+            self._pyramid.append((pattern, pixels))
+
+        return self._pyramid[level][0]
+
+    def _chooseLevel(self, ctxt, xl, xr, yt, yb):
+        """Pick the pyramid level to paint with, given the extent of the
+        image in user coordinates."""
+
+        if self._pixels is None:
+            return 0
+
+        if _isVectorTarget(ctxt):
+            # Vector device units are points.
+            if self.embedDPI is None:
+                return 0
+            pixelsPerUnit = self.embedDPI / 72.0
+        elif self.mipmap:
+            pixelsPerUnit = 1.0
+        else:
+            return 0
+
+        w = self.surface.get_width()
+        h = self.surface.get_height()
+        sx = np.hypot(*ctxt.user_to_device_distance((xr - xl) / w, 0.0))
+        sy = np.hypot(*ctxt.user_to_device_distance(0.0, (yb - yt) / h))
+        scale = max(sx, sy) * pixelsPerUnit
+
+        if not scale > 0 or scale >= 1:
+            return 0
+
+        level = int(np.floor(np.log2(1.0 / scale)))
+        maxlevel = int(np.ceil(np.log2(max(w, h))))
+        return min(level, maxlevel)
+
+    def _encode(self, pattern, pixels):
+        """Return (mimetype, data) for an image source encoded in the
+        "embedFormat", or None if it can't be."""
+
+        import io
+
+        buf = io.BytesIO()
+
+        if self.embedFormat == "png":
+            pattern.get_surface().write_to_png(buf)
+            return cairo.MIME_TYPE_PNG, buf.getvalue()
+
+        if self.embedFormat != "jpeg":
+            raise ValueError("unsupported embedFormat %r" % self.embedFormat)
+
+        if self._format == cairo.FORMAT_A8:
+            return None
+
+        argb = pixels.view(np.uint32)
+
+        if self._format == cairo.FORMAT_ARGB32 and ((argb >> 24) != 0xFF).any():
+            return None  # JPEG can't represent transparency
+
+        from PIL import Image
+
+        rgb = np.empty(argb.shape + (3,), dtype=np.uint8)
+        rgb[..., 0] = argb >> 16
+        rgb[..., 1] = argb >> 8
+        rgb[..., 2] = argb
+        Image.fromarray(rgb, "RGB").save(buf, "JPEG", quality=self.embedQuality)
+        return cairo.MIME_TYPE_JPEG, buf.getvalue()
+
+    def _attachEmbedding(self, key, pattern, pixels):
+        """Attach precompressed data to the surface of an image source,
+        identified by 'key', if they're wanted and not already there."""
+
+        if self.embedFormat is None:
+            if self._embedded:
+                # Embedding has been turned off since an earlier paint;
+                # take its data off of every surface they may be on.
+                surfaces = [pattern.get_surface()]
+                surfaces += [p.get_surface() for p, ign in self._pyramid or ()]
+
+                if self._cropped is not None:
+                    surfaces.append(self._cropped[1].get_surface())
+
+                for surface in surfaces:
+                    for mimetype in cairo.MIME_TYPE_PNG, cairo.MIME_TYPE_JPEG:
+                        surface.set_mime_data(mimetype, None)
+
+            self._embedded = None
+            return
+
+        if self._embedded is None:
+            self._embedded = {}
+
+        settings = (self.embedFormat, self.embedQuality)
+
+        if self._embedded.get(key) == settings:
+            return
+
+        surface = pattern.get_surface()
+
+        for mimetype in cairo.MIME_TYPE_PNG, cairo.MIME_TYPE_JPEG:
+            surface.set_mime_data(mimetype, None)
+
+        encoded = self._encode(pattern, pixels)
+
+        if encoded is not None:
+            surface.set_mime_data(*encoded)
+
+        self._embedded[key] = settings
+
+    def _visiblePixels(self, xl, xr, yt, yb, level):
+        """Return the part of a pyramid level that can show up in the
+        field, as (col0, row0, col1, row1) in that level's pixels, or None
+        if none of it can. A pixel of slop is allowed for filtering."""
+
+        w = self.surface.get_width()
+        h = self.surface.get_height()
+        ranges = []
+
+        for lo, hi, extent, size in (
+            (xl, xr, self.fullw, w),
+            (yt, yb, self.fullh, h),
+        ):
+            if hi == lo:
+                return None
+
+            u = (np.array([0.0, extent]) - lo) * (size / (hi - lo))
+            p0 = int(np.clip(np.floor(u.min()) - 1, 0, size))
+            p1 = int(np.clip(np.ceil(u.max()) + 1, 0, size))
+
+            if p1 <= p0:
+                return None
+
+            # Round outwards onto the level's pixels.
+            k = 2**level
+            ranges.append((p0 // k, min(-(-p1 // k), -(-size // k))))
+
+        (c0, c1), (r0, r1) = ranges
+        return c0, r0, c1, r1
+
+    def _croppedSource(self, level, crop, vector):
+        """Return (pattern, pixels) for part of a pyramid level. Bitmap
+        targets get a view of the level's surface; vector targets get a
+        copy, so that the rest of the image isn't embedded. The most
+        recent copy is kept."""
+
+        pattern, pixels = self._pyramid[level]
+        c0, r0, c1, r1 = crop
+
+        if not vector:
+            sub = pattern.get_surface().create_for_rectangle(c0, r0, c1 - c0, r1 - r0)
+            subpattern = cairo.SurfacePattern(sub)
+            subpattern.set_filter(pattern.get_filter())
+            return subpattern, pixels[r0:r1, c0:c1]
+
+        key = (level, crop)
+
+        if self._cropped is None or self._cropped[0] != key:
+            if self._cropped is not None and self._embedded is not None:
+                self._embedded.pop(self._cropped[0], None)
+
+            surface, subpixels = self._createSurface(self._format, c1 - c0, r1 - r0)
+            subpixels[...] = pixels[r0:r1, c0:c1]
+            surface.mark_dirty()
+            subpattern = cairo.SurfacePattern(surface)
+            subpattern.set_filter(pattern.get_filter())
+            self._cropped = (key, subpattern, subpixels)
+
+        return self._cropped[1:]
+
     def getDataBounds(self):
         return (
             min(self.leftx, self.rightx),
@@ -3125,18 +3986,58 @@ class ImagePainter(FieldPainter):
     def doPaint(self, ctxt, style):
         super(ImagePainter, self).doPaint(ctxt, style)
 
-        xl = self.xform.mapX(self.leftx)
-        xr = self.xform.mapX(self.rightx)
-        yt = self.xform.mapY(self.topy)
-        yb = self.xform.mapY(self.bottomy)
+        # The raw transform is needed to place images that extend far
+        # beyond the field accurately.
+
+        xl = self.rawxform.mapX(self.leftx)
+        xr = self.rawxform.mapX(self.rightx)
+        yt = self.rawxform.mapY(self.topy)
+        yb = self.rawxform.mapY(self.bottomy)
+
+        w = self.surface.get_width()
+        h = self.surface.get_height()
+        level = self._chooseLevel(ctxt, xl, xr, yt, yb)
+        pattern = self.pattern
+        k = 2**level
+        c0 = r0 = 0
+        vector = _isVectorTarget(ctxt)
+
+        if self._pixels is not None:
+            crop = self._visiblePixels(xl, xr, yt, yb, level)
+
+            if crop is None:
+                return
+
+            pattern = self._mipmapLevel(level)
+            pixels = self._pyramid[level][1]
+
+            if crop != (0, 0, pixels.shape[1], pixels.shape[0]):
+                pattern, pixels = self._croppedSource(level, crop, vector)
+                c0, r0 = crop[:2]
+            else:
+                crop = None
+
+            if vector:
+                self._attachEmbedding((level, crop), pattern, pixels)
+
+        # Work in level-0 pixels relative to the corner of what's painted.
+
+        pw = (xr - xl) / w
+        ph = (yb - yt) / h
 
         ctxt.save()
         style.apply(ctxt, self.style)
-        ctxt.translate(xl, yt)
-        ctxt.scale(
-            (xr - xl) / self.surface.get_width(), (yb - yt) / self.surface.get_height()
-        )
-        ctxt.set_source(self.pattern)
+        ctxt.translate(xl + c0 * k * pw, yt + r0 * k * ph)
+        ctxt.scale(pw, ph)
+
+        if level > 0:
+            # Padded levels overhang the image slightly, so clip to it.
+            ctxt.new_path()
+            ctxt.rectangle(-c0 * k, -r0 * k, w, h)
+            ctxt.clip()
+            ctxt.scale(k, k)
+
+        ctxt.set_source(pattern)
         ctxt.paint()
         ctxt.restore()
 
@@ -3160,6 +4061,14 @@ class RectCoordinates(object):
     def arb2lin(self, arbx, arby):
         raise NotImplementedError()
 
+    def lin2arbJacobian(self, linx, liny):
+        """Optional analytic derivatives of lin2arb. Returns an array J of
+        shape (2, 2, n) with J[i, j] the derivative of arbitrary coordinate
+        i with respect to linear coordinate j, or None if the derivatives
+        aren't available, in which case they're found by finite
+        differences."""
+        return None
+
 
 DELTA = 1e-6
 
@@ -3167,10 +4076,16 @@ DELTA = 1e-6
 class CoordinateAxis(RectAxis):
     defaultPainter = LinearAxisPainter
 
+    _boundsCache = None
+
     def __init__(self, coordsys, side):
         self.coordsys = coordsys
         self.side = side
 
+        # The number of Newton iterations done by transformWithDirection
+        # on this axis, for gauging the cost of labeling.
+        self.nIterations = 0
+
     def normalize(self):
         self.coordsys.field.xaxis.normalize()
         self.coordsys.field.yaxis.normalize()
@@ -3178,18 +4093,33 @@ class CoordinateAxis(RectAxis):
         if self.min > self.max:
             self.reverse = True
 
-    def _raw_min(self):
+    def _rawBounds(self):
+        """The arbitrary coordinate values at the two ends of our side of
+        the field, recomputed only when the field bounds change."""
         cs = self.coordsys
+        xaxis = cs.field.xaxis
+        yaxis = cs.field.yaxis
+        key = (xaxis.min, xaxis.max, yaxis.min, yaxis.max)
+
+        if self._boundsCache is not None and self._boundsCache[0] == key:
+            return self._boundsCache[1]
 
         if self.side == RectPlot.SIDE_TOP:
-            return cs.lin2arb(cs.field.xaxis.min, cs.field.yaxis.max)[0][0]
-        if self.side == RectPlot.SIDE_BOTTOM:
-            return cs.lin2arb(cs.field.xaxis.min, cs.field.yaxis.min)[0][0]
-        if self.side == RectPlot.SIDE_LEFT:
-            return cs.lin2arb(cs.field.xaxis.min, cs.field.yaxis.min)[1][0]
-        if self.side == RectPlot.SIDE_RIGHT:
-            return cs.lin2arb(cs.field.xaxis.max, cs.field.yaxis.min)[1][0]
-        assert False, "not reached"
+            bounds = cs.lin2arb([xaxis.min, xaxis.max], yaxis.max)[0]
+        elif self.side == RectPlot.SIDE_BOTTOM:
+            bounds = cs.lin2arb([xaxis.min, xaxis.max], yaxis.min)[0]
+        elif self.side == RectPlot.SIDE_LEFT:
+            bounds = cs.lin2arb(xaxis.min, [yaxis.min, yaxis.max])[1]
+        elif self.side == RectPlot.SIDE_RIGHT:
+            bounds = cs.lin2arb(xaxis.max, [yaxis.min, yaxis.max])[1]
+        else:
+            assert False, "not reached"
+
+        self._boundsCache = (key, (bounds[0], bounds[1]))
+        return self._boundsCache[1]
+
+    def _raw_min(self):
+        return self._rawBounds()[0]
 
     @property
     def min(self):
@@ -3198,17 +4128,7 @@ class CoordinateAxis(RectAxis):
         return self._raw_min()
 
     def _raw_max(self):
-        cs = self.coordsys
-
-        if self.side == RectPlot.SIDE_TOP:
-            return cs.lin2arb(cs.field.xaxis.max, cs.field.yaxis.max)[0][0]
-        if self.side == RectPlot.SIDE_BOTTOM:
-            return cs.lin2arb(cs.field.xaxis.max, cs.field.yaxis.min)[0][0]
-        if self.side == RectPlot.SIDE_LEFT:
-            return cs.lin2arb(cs.field.xaxis.min, cs.field.yaxis.max)[1][0]
-        if self.side == RectPlot.SIDE_RIGHT:
-            return cs.lin2arb(cs.field.xaxis.max, cs.field.yaxis.max)[1][0]
-        assert False, "should not be reached"
+        return self._rawBounds()[1]
 
     @property
     def max(self):
@@ -3225,7 +4145,8 @@ class CoordinateAxis(RectAxis):
         # is via the linear coordinate system, so we have to
         # guess linear coordinate values that should correspond
         # to the desired arbitrary values, then iterate towards
-        # a better mapping.
+        # a better mapping. Derivatives come from the coordinate
+        # system if it provides them, and finite differences if not.
 
         if self.side in (RectPlot.SIDE_TOP, RectPlot.SIDE_BOTTOM):
             if self.side == RectPlot.SIDE_TOP:
@@ -3233,17 +4154,24 @@ class CoordinateAxis(RectAxis):
             else:
                 yval = cs.field.yaxis.min
 
-            w = 0.5 * (
-                cs.lin2arb(cs.field.xaxis.min, yval)[1]
-                + cs.lin2arb(cs.field.xaxis.max, yval)[1]
-            )
+            w = cs.lin2arb([cs.field.xaxis.min, cs.field.xaxis.max], yval)[1].mean()
             lin = cs.arb2lin(arb, w)[0]
             lin2arb = lambda lin: cs.lin2arb(lin, yval)[0]
             norm = cs.field.xaxis.transform
 
+            def darbdlin(lin):
+                jac = cs.lin2arbJacobian(lin, yval)
+                if jac is None:
+                    return (lin2arb(lin + DELTA) - lin2arb(lin)) / DELTA
+                return jac[0, 0]
+
             def dorthdnorm(lin):
                 # Y axis is inverted sense
-                do = cs.lin2arb(lin, yval + DELTA)[0] - cs.lin2arb(lin, yval)[0]
+                jac = cs.lin2arbJacobian(lin, yval)
+                if jac is None:
+                    do = cs.lin2arb(lin, yval + DELTA)[0] - cs.lin2arb(lin, yval)[0]
+                else:
+                    do = jac[0, 1] * DELTA
                 dn = cs.field.yaxis.transform(yval - DELTA) - cs.field.yaxis.transform(
                     yval
                 )
@@ -3255,16 +4183,23 @@ class CoordinateAxis(RectAxis):
             else:
                 xval = cs.field.xaxis.min
 
-            w = 0.5 * (
-                cs.lin2arb(xval, cs.field.yaxis.min)[0]
-                + cs.lin2arb(xval, cs.field.yaxis.max)[0]
-            )
+            w = cs.lin2arb(xval, [cs.field.yaxis.min, cs.field.yaxis.max])[0].mean()
             lin = cs.arb2lin(w, arb)[1]
             lin2arb = lambda lin: cs.lin2arb(xval, lin)[1]
             norm = cs.field.yaxis.transform
 
+            def darbdlin(lin):
+                jac = cs.lin2arbJacobian(xval, lin)
+                if jac is None:
+                    return (lin2arb(lin + DELTA) - lin2arb(lin)) / DELTA
+                return jac[1, 1]
+
             def dorthdnorm(lin):
-                do = cs.lin2arb(xval + DELTA, lin)[1] - cs.lin2arb(xval, lin)[1]
+                jac = cs.lin2arbJacobian(xval, lin)
+                if jac is None:
+                    do = cs.lin2arb(xval + DELTA, lin)[1] - cs.lin2arb(xval, lin)[1]
+                else:
+                    do = jac[1, 0] * DELTA
                 dn = cs.field.xaxis.transform(xval + DELTA) - cs.field.xaxis.transform(
                     xval
                 )
@@ -3290,17 +4225,15 @@ class CoordinateAxis(RectAxis):
             if not np.any(np.abs(err) / arbscale > 1e-6):
                 break
 
-            dlindarb = DELTA / (lin2arb(lin + DELTA) - lin2arb(lin))
-            lin += err * dlindarb
+            self.nIterations += 1
+            lin += err / darbdlin(lin)
         else:
             raise ValueError("cannot converge on transformed values for %s" % arbvalues)
 
         # Now, get the angle between the arbitrary coordinate system
         # and the linear coordsys, expressed in the normalized coordinates.
 
-        darbdnorm = (lin2arb(lin + DELTA) - lin2arb(lin)) / (
-            norm(lin + DELTA) - norm(lin)
-        )
+        darbdnorm = darbdlin(lin) * DELTA / (norm(lin + DELTA) - norm(lin))
         dodn = dorthdnorm(lin)
         return norm(lin), np.arctan2(dodn, darbdnorm)
 
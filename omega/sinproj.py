@@ -107,7 +107,35 @@ class SphereSinProjection(rect.RectCoordinates):
         w = np.where(rho == 0)
         result[1, w] = self.lat0
         w = np.where(rho != 0)
-        result[1, w] = np.arcsin(cosc * sl0 + liny * sinc * cl0 / rho[w])
+        result[1, w] = np.arcsin(cosc[w] * sl0 + liny[w] * sinc[w] * cl0 / rho[w])
+        return result
+
+    def lin2arbJacobian(self, linx, liny):
+        # Invert the Jacobian of arb2lin, which is simple, at the
+        # corresponding arbitrary coordinates.
+
+        lon, lat = self.lin2arb(linx, liny)
+        dlon = lon - self.lon0
+        cl0 = np.cos(self.lat0)
+        sl0 = np.sin(self.lat0)
+        coslat = np.cos(lat)
+        sinlat = np.sin(lat)
+
+        dxdlon = coslat * np.cos(dlon)
+        dxdlat = -sinlat * np.sin(dlon)
+        dydlon = sl0 * coslat * np.sin(dlon)
+        dydlat = cl0 * coslat + sl0 * sinlat * np.cos(dlon)
+
+        if self.negatex:
+            dxdlon = -dxdlon
+            dxdlat = -dxdlat
+
+        det = dxdlon * dydlat - dxdlat * dydlon
+        result = np.empty((2, 2, lon.size))
+        result[0, 0] = dydlat / det
+        result[0, 1] = -dxdlat / det
+        result[1, 0] = -dydlon / det
+        result[1, 1] = dxdlon / det
         return result
 
     def arb2lin(self, arbx, arby):
@@ -25,7 +25,8 @@ from math import pi, sqrt
 
 import numpy as np
 
-from .base import Stamp
+from .base import Stamp, _isVectorTarget
+from .paths import appendPath
 
 _defaultStampSize = 5
 
@@ -139,8 +140,26 @@ class PrimaryRStamp(RStamp):
     constant or be stored in the dataholder (as indicated by a negative value
     passed to __init__).
 
+    Stamps drawing one of the standard symbols (symCircle and friends) paint
+    them in batches: the outlines of up to "batchSize" points are added to
+    a single path, which is then filled and stroked once, rather than
+    painting each point with its own transformation and Cairo state. Set
+    "batchPaint" to False to paint point by point. The result is the same
+    except where symbols with differing stroke and fill styles overlap, in
+    which case batched outlines are all drawn over all fills.
+
+    When painting in batches onto a bitmap, each distinct symbol is instead
+    rendered once into a small image (at a few sub-pixel offsets), cached
+    by the Style, and copied to each point. This is skipped for vector
+    output, which always gets exact paths, and if "useSprites" is False.
+
     """
 
+    symbolFunc = None
+    batchPaint = True
+    batchSize = 1000
+    useSprites = True
+
     def __init__(
         self,
         size=None,
@@ -199,9 +218,30 @@ class PrimaryRStamp(RStamp):
 
         return (s, r)
 
+    def _getBatchSymbol(self, style):
+        """Return (symfunc, pathpainter) for batched painting, where symfunc
+        is one of the sym* functions, or (None, None) if this stamp does not
+        draw a standard symbol."""
+        return self.symbolFunc, self._path_painter
+
     def _paintData(self, ctxt, style, x, y, mydata):
         sizes, rots = mydata
 
+        if self.batchPaint:
+            symfunc, pp = self._getBatchSymbol(style)
+            outline = _symbolOutlines.get(symfunc)
+
+            if outline is not None:
+                if self.useSprites and _paintSprites(
+                    ctxt, style, symfunc, outline, pp, x, y, sizes, rots
+                ):
+                    return
+
+                _paintSymbols(
+                    ctxt, style, outline, pp, x, y, sizes, rots, self.batchSize
+                )
+                return
+
         for i in range(0, x.size):
             ctxt.save()
             ctxt.translate(x[i], y[i])
@@ -303,6 +343,238 @@ def symPlus(ctxt, style, size, pp=None):
     pp.paint(True, ctxt, style)
 
 
+# Outlines of the above symbols, for painting many of them at once. Each is
+# (linesOnly, radius, subpaths), in units of size * style.smallScale; a
+# non-None radius denotes a circle, and each subpath is (vertices, closed).
+
+_h = 0.5 / sqrt(2)
+
+_symbolOutlines = {
+    symCircle: (False, 0.5, ()),
+    symUpTriangle: (
+        False,
+        None,
+        (([(0, -0.666666), (0.5, 0.333334), (-0.5, 0.333334)], True),),
+    ),
+    symDownTriangle: (
+        False,
+        None,
+        (([(0, 0.666666), (-0.5, -0.333334), (0.5, -0.333334)], True),),
+    ),
+    symDiamond: (
+        False,
+        None,
+        (([(0, -0.5), (0.5, 0), (0, 0.5), (-0.5, 0)], True),),
+    ),
+    symBox: (False, None, (([(-_h, -_h), (_h, -_h), (_h, _h), (-_h, _h)], True),)),
+    symX: (
+        True,
+        None,
+        (([(-_h, -_h), (_h, _h)], False), ([(-_h, _h), (_h, -_h)], False)),
+    ),
+    symPlus: (
+        True,
+        None,
+        (([(-0.5, 0), (0.5, 0)], False), ([(0, -0.5), (0, 0.5)], False)),
+    ),
+}
+
+del _h
+
+
+def _paintSymbols(ctxt, style, outline, pp, x, y, sizes, rots, batchSize):
+    """Paint the symbol with the given outline at every point, filling and
+    stroking once for each batch of @batchSize points. Points with
+    non-finite coordinates, sizes or rotations are skipped."""
+
+    linesOnly, radius, subpaths = outline
+    scale = np.broadcast_to(np.asarray(sizes) * style.smallScale, x.shape)
+    rots = np.broadcast_to(rots, x.shape)
+
+    good = np.isfinite(x) & np.isfinite(y) & np.isfinite(scale) & np.isfinite(rots)
+    x, y, scale, rots = x[good], y[good], scale[good], rots[good]
+    cos = np.cos(rots)
+    sin = np.sin(rots)
+
+    for start in range(0, x.size, batchSize):
+        s = slice(start, start + batchSize)
+
+        if radius is not None:
+            for cx, cy, r, a in zip(
+                x[s].tolist(),
+                y[s].tolist(),
+                (scale[s] * radius).tolist(),
+                rots[s].tolist(),
+            ):
+                ctxt.new_sub_path()
+                ctxt.arc(cx, cy, r, a, a + 2 * pi)
+
+        _appendOutlines(ctxt, x[s], y[s], scale[s], cos[s], sin[s], subpaths)
+        pp.paint(linesOnly, ctxt, style)
+
+
+def _appendOutlines(ctxt, x, y, scale, cos, sin, subpaths):
+    """Add the (vertices, closed) @subpaths to the current path at every
+    point, scaled by @scale and rotated by the angle with the given cosine
+    and sine."""
+
+    for verts, closed in subpaths:
+        v = np.asarray(verts, dtype=float)
+        sc = scale[:, np.newaxis]
+        c = cos[:, np.newaxis]
+        sn = sin[:, np.newaxis]
+        px = x[:, np.newaxis] + sc * (v[:, 0] * c - v[:, 1] * sn)
+        py = y[:, np.newaxis] + sc * (v[:, 0] * sn + v[:, 1] * c)
+        breaks = np.arange(px.size) % v.shape[0] == 0
+        appendPath(ctxt, np.column_stack((px.ravel(), py.ravel())), breaks, closed)
+
+
+_segmentChunkSize = 5000
+
+
+def _strokeSegments(ctxt, x0, y0, x1, y1, minLength=0):
+    """Stroke the straight segments from (@x0, @y0) to (@x1, @y1), with one
+    stroke per chunk of _segmentChunkSize segments. Segments with
+    non-finite ends, or shorter than @minLength device units, are
+    skipped."""
+
+    x0, y0, x1, y1 = np.broadcast_arrays(x0, y0, x1, y1)
+    good = np.isfinite(x0) & np.isfinite(y0) & np.isfinite(x1) & np.isfinite(y1)
+
+    if minLength > 0:
+        xx, yx, xy, yy, ign, ign = ctxt.get_matrix()
+        dx = x1 - x0
+        dy = y1 - y0
+        good &= np.hypot(xx * dx + xy * dy, yx * dx + yy * dy) >= minLength
+
+    idx = np.flatnonzero(good)
+
+    for start in range(0, idx.size, _segmentChunkSize):
+        s = idx[start : start + _segmentChunkSize]
+        xy = np.empty((2 * s.size, 2))
+        xy[0::2, 0] = x0[s]
+        xy[0::2, 1] = y0[s]
+        xy[1::2, 0] = x1[s]
+        xy[1::2, 1] = y1[s]
+        appendPath(ctxt, xy, np.arange(xy.shape[0]) % 2 == 0)
+        ctxt.stroke()
+
+
+# Sprites are rendered at this many sub-pixel offsets along each axis, and
+# only used if there are no more than _maxSpriteShapes distinct combinations
+# of size and rotation among the points.
+
+_spriteSubpixels = 2
+_maxSpriteShapes = 16
+
+
+def _paintSprites(ctxt, style, symfunc, outline, pp, x, y, sizes, rots):
+    """Paint a symbol at every point by copying pre-rendered images of it,
+    returning False without painting anything if that isn't possible
+    here: for vector output, transformed or patterned drawing states, or
+    too many different sizes and rotations."""
+
+    if _isVectorTarget(ctxt):
+        return False
+
+    import cairo
+
+    xx, yx, xy, yy, x0, y0 = ctxt.get_matrix()
+
+    if yx != 0 or xy != 0 or xx != yy or xx <= 0:
+        return False
+
+    source = ctxt.get_source()
+
+    if not isinstance(source, cairo.SolidPattern):
+        return False
+
+    if ctxt.get_dash_count() or ctxt.get_operator() != cairo.OPERATOR_OVER:
+        return False
+
+    state = (
+        source.get_rgba(),
+        ctxt.get_line_width(),
+        ctxt.get_line_cap(),
+        ctxt.get_line_join(),
+        ctxt.get_miter_limit(),
+        ctxt.get_fill_rule(),
+        ctxt.get_antialias(),
+        xx,
+    )
+
+    sizes = np.broadcast_to(sizes, x.shape)
+    rots = np.broadcast_to(rots, x.shape)
+    good = np.isfinite(x) & np.isfinite(y) & np.isfinite(sizes) & np.isfinite(rots)
+    x, y, sizes, rots = x[good], y[good], sizes[good], rots[good]
+
+    if x.size == 0:
+        return True
+
+    shapes, shapeidx = np.unique(np.stack((sizes, rots)), axis=1, return_inverse=True)
+
+    if shapes.shape[1] > _maxSpriteShapes:
+        return False
+
+    # Device pixel of each point, and which sub-pixel phase it falls in.
+
+    n = _spriteSubpixels
+    dx = xx * x + x0
+    dy = yy * y + y0
+    ix = np.floor(dx)
+    iy = np.floor(dy)
+    phx = np.minimum(np.floor((dx - ix) * n), n - 1).astype(int)
+    phy = np.minimum(np.floor((dy - iy) * n), n - 1).astype(int)
+    group = (shapeidx.ravel() * n + phx) * n + phy
+
+    linesOnly, radius, subpaths = outline
+
+    if radius is None:
+        radius = max(np.abs(np.asarray(v, dtype=float)).max() for v, c in subpaths)
+
+    pad = 0.5 * ctxt.get_line_width() * max(ctxt.get_miter_limit(), 1) + 1
+
+    ctxt.save()
+    ctxt.identity_matrix()
+
+    for g in np.unique(group):
+        shape, rem = divmod(int(g), n * n)
+        px, py = divmod(rem, n)
+        size, rot = shapes[:, shape]
+        half = int(np.ceil(xx * (radius * size * style.smallScale + pad))) + 1
+
+        def render():
+            surf = cairo.ImageSurface(cairo.FORMAT_ARGB32, 2 * half, 2 * half)
+            sc = cairo.Context(surf)
+            sc.translate(half + px / n, half + py / n)
+            sc.scale(xx, xx)
+            sc.rotate(rot)
+            sc.set_source_rgba(*state[0])
+            sc.set_line_width(state[1])
+            sc.set_line_cap(state[2])
+            sc.set_line_join(state[3])
+            sc.set_miter_limit(state[4])
+            sc.set_fill_rule(state[5])
+            sc.set_antialias(state[6])
+            symfunc(sc, style, size, pp)
+            surf.flush()
+            return surf
+
+        sprite = style.getSprite(
+            (symfunc, pp, float(size), float(rot), px, py) + state, render
+        )
+
+        sel = group == g
+
+        for ox, oy in zip((ix[sel] - half).tolist(), (iy[sel] - half).tolist()):
+            ctxt.set_source_surface(sprite, ox, oy)
+            ctxt.rectangle(ox, oy, 2 * half, 2 * half)
+            ctxt.fill()
+
+    ctxt.restore()
+    return True
+
+
 # Stamps drawing these symbols
 
 
@@ -312,21 +584,29 @@ class Nothing(PrimaryRStamp):
 
 
 class Circle(PrimaryRStamp):
+    symbolFunc = staticmethod(symCircle)
+
     def _paintOne(self, ctxt, style, size):
         symCircle(ctxt, style, size, self._path_painter)
 
 
 class UpTriangle(PrimaryRStamp):
+    symbolFunc = staticmethod(symUpTriangle)
+
     def _paintOne(self, ctxt, style, size):
         symUpTriangle(ctxt, style, size, self._path_painter)
 
 
 class DownTriangle(PrimaryRStamp):
+    symbolFunc = staticmethod(symDownTriangle)
+
     def _paintOne(self, ctxt, style, size):
         symDownTriangle(ctxt, style, size, self._path_painter)
 
 
 class Diamond(PrimaryRStamp):
+    symbolFunc = staticmethod(symDiamond)
+
     def _paintOne(self, ctxt, style, size):
         symDiamond(ctxt, style, size, self._path_painter)
 
@@ -338,6 +618,8 @@ class Box(PrimaryRStamp):
 
     """
 
+    symbolFunc = staticmethod(symBox)
+
     def _paintOne(self, ctxt, style, size):
         symBox(ctxt, style, size, self._path_painter)
 
@@ -348,6 +630,8 @@ class X(PrimaryRStamp):
 
     """
 
+    symbolFunc = staticmethod(symX)
+
     def _paintOne(self, ctxt, style, size):
         symX(ctxt, style, size, self._path_painter)
 
@@ -355,6 +639,8 @@ class X(PrimaryRStamp):
 class Plus(PrimaryRStamp):
     "`size` gives the side length of the plus in style.smallScale." ""
 
+    symbolFunc = staticmethod(symPlus)
+
     def _paintOne(self, ctxt, style, size):
         symPlus(ctxt, style, size, self._path_painter)
 
@@ -364,6 +650,9 @@ class Plus(PrimaryRStamp):
 # the use of different symbols for different datasets in a plot
 
 
+_defaultPathPainter = PathPainter()
+
+
 class DataThemedStamp(PrimaryRStamp):
     def __init__(self, snholder, size=None, rot=0):
         super(DataThemedStamp, self).__init__(size, rot)
@@ -379,6 +668,18 @@ class DataThemedStamp(PrimaryRStamp):
         dsn = self.snholder.dsn
         style.data.getSymbolFunc(dsn)(ctxt, style, size)
 
+    def _getBatchSymbol(self, style):
+        if self.snholder is None:
+            raise Exception("Need to call setHolder before painting DataThemedStamp!")
+
+        func = style.data.getSymbolFunc(self.snholder.dsn)
+        pp = getattr(func, "pathPainter", None)
+
+        if pp is None:
+            pp = _defaultPathPainter
+
+        return getattr(func, "symFunc", func), pp
+
 
 # Here are some utility stamps that are *not*
 # primary stamps. They build on top of other stamps
@@ -386,6 +687,12 @@ class DataThemedStamp(PrimaryRStamp):
 
 
 class WithYErrorBars(RStamp):
+    """Draws Y error bars on top of another stamp. All of the bars are
+    stroked together, and bars shorter than minBarLength device units,
+    which would be hidden by the symbol anyway, are skipped."""
+
+    minBarLength = 0.5
+
     def __init__(self, substamp):
         self.substamp = substamp
 
@@ -405,11 +712,7 @@ class WithYErrorBars(RStamp):
         subdata = mydata[2:]
 
         self.substamp._paintData(ctxt, style, x, y, subdata)
-
-        for i in range(0, x.size):
-            ctxt.move_to(x[i], y1[i])
-            ctxt.line_to(x[i], y2[i])
-            ctxt.stroke()
+        _strokeSegments(ctxt, x, y1, x, y2, self.minBarLength)
 
     def _getSampleValues(self, style, x, y):
         subd = self.substamp._getSampleValues(style, x, y)
@@ -425,6 +728,12 @@ class WithYErrorBars(RStamp):
 
 
 class WithXErrorBars(RStamp):
+    """Draws X error bars on top of another stamp. All of the bars are
+    stroked together, and bars shorter than minBarLength device units,
+    which would be hidden by the symbol anyway, are skipped."""
+
+    minBarLength = 0.5
+
     def __init__(self, substamp):
         self.substamp = substamp
 
@@ -444,11 +753,7 @@ class WithXErrorBars(RStamp):
         subdata = mydata[2:]
 
         self.substamp._paintData(ctxt, style, x, y, subdata)
-
-        for i in range(0, x.size):
-            ctxt.move_to(x1[i], y[i])
-            ctxt.line_to(x2[i], y[i])
-            ctxt.stroke()
+        _strokeSegments(ctxt, x1, y, x2, y, self.minBarLength)
 
     def _getSampleValues(self, style, x, y):
         subd = self.substamp._getSampleValues(style, x, y)
@@ -466,53 +771,53 @@ class WithXErrorBars(RStamp):
 # Arrow painting
 
 
+_arrowDirections = {
+    "left": (-1, 0),
+    "right": (1, 0),
+    "top": (0, -1),
+    "bottom": (0, 1),
+}
+
+
 def arrow(ctxt, x, y, direction, length, headsize):
+    if direction not in _arrowDirections:
+        raise ValueError('unrecognized arrow direction "%s"' % direction)
+
+    ux, uy = _arrowDirections[direction]
+    _paintArrows(ctxt, np.atleast_1d(x), np.atleast_1d(y), ux, uy, length, headsize)
+
+
+def _paintArrows(ctxt, x, y, ux, uy, length, headsize):
+    """Paint arrows starting at each point (@x, @y) and pointing along the
+    unit vector (@ux, @uy). Arrows with a negative @length point the other
+    way. All of the shafts are stroked at once, then all of the heads are
+    filled and stroked."""
+
+    x, y, ux, uy, length = np.broadcast_arrays(x, y, ux, uy, length)
+    flip = length < 0
+    ux = np.where(flip, -ux, ux)
+    uy = np.where(flip, -uy, uy)
+    length = np.abs(length)
+
     dperp = headsize * 0.95
     dpara = headsize * 0.3
+    llength = np.maximum(length - dperp, 0)
+    hlength = length - llength
 
-    if length < 0:
-        if direction == "left":
-            newdir = "right"
-        elif direction == "right":
-            newdir = "left"
-        elif direction == "top":
-            newdir = "bottom"
-        elif direction == "bottom":
-            newdir = "top"
-
-        length = -length
-        direction = newdir
-
-    llength = max(length - dperp, 0)
-
-    if direction == "left":
-        dlx, dly = -llength, 0
-        dh1x, dh1y = 0, dpara
-        dh2x, dh2y = -(length - llength), dpara
-    elif direction == "right":
-        dlx, dly = llength, 0
-        dh1x, dh1y = 0, -dpara
-        dh2x, dh2y = length - llength, -dpara
-    elif direction == "top":
-        dlx, dly = 0, -llength
-        dh1x, dh1y = -dpara, 0
-        dh2x, dh2y = -dpara, -(length - llength)
-    elif direction == "bottom":
-        dlx, dly = 0, llength
-        dh1x, dh1y = dpara, 0
-        dh2x, dh2y = dpara, length - llength
-    else:
-        raise ValueError('unrecognized arrow direction "%s"' % direction)
+    # (px, py) is perpendicular to the arrow; (ex, ey) is the end of the
+    # shaft, where the base of the head sits.
 
-    if llength != 0:
-        ctxt.move_to(x, y)
-        ctxt.rel_line_to(dlx, dly)
-        ctxt.stroke()
+    px, py = uy, -ux
+    ex = x + ux * llength
+    ey = y + uy * llength
 
-    ctxt.move_to(x + dlx + dh1x, y + dly + dh1y)
-    ctxt.rel_line_to(-2 * dh1x, -2 * dh1y)
-    ctxt.rel_line_to(dh2x, dh2y)
-    ctxt.close_path()
+    shaft = llength != 0
+    _strokeSegments(ctxt, x[shaft], y[shaft], ex[shaft], ey[shaft])
+
+    hx = np.column_stack((ex + px * dpara, ex - px * dpara, ex + ux * hlength))
+    hy = np.column_stack((ey + py * dpara, ey - py * dpara, ey + uy * hlength))
+    breaks = np.arange(hx.size) % 3 == 0
+    appendPath(ctxt, np.column_stack((hx.ravel(), hy.ravel())), breaks, True)
     ctxt.fill_preserve()
     ctxt.stroke()
 
@@ -627,36 +932,40 @@ class _WithArrow(RStamp):
         subdata = mydata[2:]
         isx = self.direction in ("left", "right")
 
+        headsize = self.headsize * style.largeScale
+
         if self.substamp is not None:
             self.substamp._paintData(ctxt, style, x, y, subdata)
+        else:
+            # Draw our little perpendicular bars, copying the sizing logic
+            # used in arrow ()
+            h = 0.3 * headsize
+
+            if isx:
+                _strokeSegments(ctxt, x, y - h, x, y + h)
+            else:
+                _strokeSegments(ctxt, x - h, y, x + h, y)
 
         if isx:
             ref = x
-            dirs = ["left", "right"]
         else:
             ref = y
-            dirs = ["top", "bottom"]
-
-        for i in range(x.size):
-            if self.substamp is None:
-                # Draw our little perpendicular bar, copying the sizing logic
-                # used in arrow ()
-                if isx:
-                    ctxt.move_to(x[i], y[i] - 0.3 * self.headsize * style.largeScale)
-                    ctxt.line_to(x[i], y[i] + 0.3 * self.headsize * style.largeScale)
-                    ctxt.stroke()
-                else:
-                    ctxt.move_to(x[i] - 0.3 * self.headsize * style.largeScale, y[i])
-                    ctxt.line_to(x[i] + 0.3 * self.headsize * style.largeScale, y[i])
-                    ctxt.stroke()
 
-            if lengths[i] != 0:
-                # This one gets drawn. Figure out the effective
-                # direction and length, set by the relation between
-                # the data coordinate and towards, and do it.
-                l = min(abs(towards[i] - ref[i]), lengths[i])
-                d = dirs[ref[i] < towards[i]]
-                arrow(ctxt, x[i], y[i], d, l, self.headsize * style.largeScale)
+        # Arrows are drawn where the length is nonzero. The effective
+        # direction and length are set by the relation between the data
+        # coordinate and towards.
+
+        ref, towards, lengths = np.broadcast_arrays(ref, towards, lengths)
+        draw = lengths != 0
+        l = np.minimum(np.abs(towards - ref), lengths)[draw]
+        sign = np.where(ref < towards, 1, -1)[draw]
+
+        if isx:
+            ux, uy = sign, 0
+        else:
+            ux, uy = 0, sign
+
+        _paintArrows(ctxt, x[draw], y[draw], ux, uy, l, headsize)
 
 
 class WithDownArrow(_WithArrow):
@@ -771,7 +1080,107 @@ def _double_limit(rot):
     return paint
 
 
+# Outlines of the above limit symbols for batched painting, as (strokes,
+# fills) lists of subpaths in units of size * style.smallScale. The fills
+# are only painted for filled symbols.
+
+_limitOutlines = {
+    "single": (
+        (
+            ([(-1, 0), (1, 0)], False),
+            ([(-0.4, 0), (0, 1), (0.4, 0)], False),
+        ),
+        (([(-0.4, 0), (0, 1), (0.4, 0)], True),),
+    ),
+    "double": (
+        (
+            (
+                [
+                    (-1.1, 0),
+                    (-1.1, 0.4),
+                    (-2, 0),
+                    (0, 0),
+                    (0, 2),
+                    (-0.4, 1.1),
+                    (0, 1.1),
+                ],
+                False,
+            ),
+        ),
+        (
+            ([(0, 2), (0, 1.1), (-0.4, 1.1)], True),
+            ([(-2, 0), (-1.1, 0), (-1.1, 0.4)], True),
+        ),
+    ),
+}
+
+# Which limit symbol, at what rotation, to draw for each combination of X
+# and Y uncertainty kinds, indexed as [uxkind, uykind] with the kinds
+# numbered as in _ms_kinds. A kind of None means a regular symbol.
+
+_ms_kinds = "nulb"  # none, upper limit, lower limit, error bars
+
+_ms_limits = [
+    [
+        (None, 0),
+        ("single", 0),
+        ("single", np.pi),
+        (None, 0),
+    ],
+    [
+        ("single", 0.5 * np.pi),
+        ("double", 0),
+        ("double", 0.5 * np.pi),
+        ("single", 0.5 * np.pi),
+    ],
+    [
+        ("single", -0.5 * np.pi),
+        ("double", -0.5 * np.pi),
+        ("double", np.pi),
+        ("single", -0.5 * np.pi),
+    ],
+    [
+        (None, 0),
+        ("single", 0),
+        ("single", np.pi),
+        (None, 0),
+    ],
+]
+
+_fillPainters = {True: PathPainter(fill=True), False: PathPainter(fill=False)}
+
+
+def _ms_uncertKinds(limstyles, bounds, values):
+    """Classify each point's uncertainty as an index into _ms_kinds."""
+
+    return np.where(
+        limstyles == -1,
+        1,
+        np.where(
+            limstyles == 1,
+            2,
+            np.where((bounds[0] == values) & (bounds[1] == values), 0, 3),
+        ),
+    )
+
+
 class MultiStamp(RStamp):
+    """A stamp whose symbol, color, size, fill, error bars, limit arrows and
+    connecting lines can all be controlled per point with data columns,
+    according to the features it is created with.
+
+    The attributes of every point are worked out up front, and points with
+    identical attributes are painted together in batches. Without the "z"
+    feature, the order in which the batches are painted is unspecified,
+    and within a batch all error bars and prepaints are drawn before any
+    of the symbols. With it, points are painted in order of increasing Z,
+    and only runs of consecutive points with identical attributes are
+    batched; points with error bars or prepaint functions are painted one
+    at a time, so that each one's extras still cover the symbols of the
+    points before it. Error bars shorter than minBarLength device units
+    are skipped.
+    """
+
     features = None
     fixedfill = True
     fixedlinestyle = None
@@ -780,6 +1189,8 @@ class MultiStamp(RStamp):
     extracolors = []
     prepaintfuncs = [lambda c, s, x, y: None]
     colormap = "black_to_blue"
+    batchSize = 1000
+    minBarLength = 0.5
 
     _cnum_cinfo = None
     _fill_cinfo = None
@@ -816,21 +1227,11 @@ class MultiStamp(RStamp):
         imisc, fmisc, allx, ally = self.data.getAllMapped(xform)
         x = allx[0]
         y = ally[0]
+        n = x.size
 
-        docnum = self._cnum_cinfo is not None
-        dofill = self._fill_cinfo is not None
-        domcolor = self._mcolor_cinfo is not None
-        doprepaint = self._prepaint_cinfo is not None
-        doshape = self._shape_cinfo is not None
-        dosize = self._size_cinfo is not None
-        dotlines = self._tlines_cinfo is not None
-        doux = self._ux_cinfo is not None
-        douy = self._uy_cinfo is not None
-        doz = self._z_cinfo is not None
-
-        if doz:
+        if self._z_cinfo is not None:
             zs = self.data.get(self._z_cinfo)[0][0]
-            zidxs = np.argsort(zs)
+            zidxs = np.argsort(zs, kind="stable")
             zsort = lambda a: a[zidxs]
             zsort2 = lambda a: a[:, zidxs]
             x = zsort(x)
@@ -838,153 +1239,200 @@ class MultiStamp(RStamp):
         else:
             zsort = zsort2 = lambda a: a
 
-        if docnum:
-            cnums = zsort(self.data.get(self._cnum_cinfo)[0][0])
+        if n == 0:
+            return
 
-        if dofill:
-            fills = zsort(self.data.get(self._fill_cinfo)[0][0])
-        else:
-            fill = self.fixedfill
+        # Classify every point. Colors are given as an index into
+        # `colors`, or -1 to leave the current color alone.
+
+        colorids = np.full(n, -1)
+        colors = {}
 
-        if domcolor:
+        if self._cnum_cinfo is not None:
+            colorids = zsort(self.data.get(self._cnum_cinfo)[0][0])
+
+            for cnum in np.unique(colorids).tolist():
+                if cnum < 0:
+                    colors[cnum] = self.extracolors[-cnum - 1]
+                else:
+                    colors[cnum] = style.colors.getDataColor(cnum)
+        elif self._mcolor_cinfo is not None:
             from pwkit import colormaps
 
             colormap = colormaps.factory_map[self.colormap]()
             rgbs = colormap(zsort(self.data.get(self._mcolor_cinfo)[1][0]))
+            rgbs, colorids = np.unique(rgbs, axis=0, return_inverse=True)
+            colorids = colorids.ravel()
 
-        if doprepaint:
+            for i, c in enumerate(rgbs.tolist()):
+                colors[i] = c[:3]
+
+        if self._fill_cinfo is not None:
+            fills = zsort(self.data.get(self._fill_cinfo)[0][0]) != 0
+        else:
+            fills = np.full(n, bool(self.fixedfill))
+
+        if self._prepaint_cinfo is not None:
             ppfuncs = zsort(self.data.get(self._prepaint_cinfo)[0][0])
+        else:
+            ppfuncs = None
 
-        if doshape:
+        if self._shape_cinfo is not None:
             shapes = zsort(self.data.get(self._shape_cinfo)[0][0])
+        else:
+            shapes = np.full(n, self.fixedshape)
 
-        if dosize:
+        if self._size_cinfo is not None:
             sizes = zsort(self.data.get(self._size_cinfo)[1][0])
         else:
-            size = self.fixedsize
+            sizes = np.full(n, self.fixedsize, dtype=float)
 
-        if doux:
+        uxkinds = uykinds = np.zeros(n, dtype=int)
+
+        if self._ux_cinfo is not None:
             d = self.data.getMapped(self._ux_cinfo, xform)
-            xlimstyles = zsort(d[0][0])
             uxs = zsort2(d[2])
-        else:
-            uxkind = "n"
+            uxkinds = _ms_uncertKinds(zsort(d[0][0]), uxs, x)
 
-        if douy:
+        if self._uy_cinfo is not None:
             d = self.data.getMapped(self._uy_cinfo, xform)
-            ylimstyles = zsort(d[0][0])
             uys = zsort2(d[3])
-        else:
-            uykind = "n"
+            uykinds = _ms_uncertKinds(zsort(d[0][0]), uys, y)
+
+        # Limits replace the regular symbol, so its shape doesn't matter.
+
+        limits = uxkinds * len(_ms_kinds) + uykinds
+        limitinfo = [kind for row in _ms_limits for kind in row]
+        haslimit = np.array([k is not None for k, r in limitinfo])[limits]
+        shapes = np.where(haslimit, -1, shapes)
 
-        if dotlines:
+        if self._tlines_cinfo is not None:
             lineinfo = zsort(self.data.get(self._tlines_cinfo)[0][0])
-            linegroups = {}
+            order = np.argsort(lineinfo, kind="stable")
+            order = order[lineinfo[order] != 0]
+            breaks = np.flatnonzero(np.diff(lineinfo[order])) + 1
 
-            for i in range(x.size):
-                idx = lineinfo[i]
-                if idx == 0:
-                    continue
-                linegroups.setdefault(idx, []).append(i)
+            # Lines with only one point are dropped.
+            runlens = np.diff(np.concatenate(([0], breaks, [order.size])))
+            order = order[np.repeat(runlens > 1, runlens)]
+            starts = np.zeros(order.size, dtype=bool)
+            starts[np.cumsum(runlens[runlens > 1])[:-1]] = True
 
             ctxt.save()
             style.apply(ctxt, self.fixedlinestyle)
+            appendPath(ctxt, np.column_stack((x[order], y[order])), starts)
+            ctxt.stroke()
+            ctxt.restore()
 
-            for points in linegroups.values():
-                n = len(points)
-                if n < 2:
-                    continue
+        # Group the points by their attributes. Sizes vary freely within
+        # a group.
 
-                ctxt.move_to(x[points[0]], y[points[0]])
-                for i in range(1, n):
-                    ctxt.line_to(x[points[i]], y[points[i]])
-                ctxt.stroke()
+        keys = [colorids, fills, shapes, limits]
 
-            ctxt.restore()
+        if ppfuncs is not None:
+            keys.append(ppfuncs)
+
+        keys = np.stack(keys, axis=1)
+
+        if self._z_cinfo is not None:
+            change = np.any(keys[1:] != keys[:-1], axis=1)
+
+            # Keep the points that have more than a symbol in their own
+            # runs, to preserve the painting order of each point's parts.
+
+            if ppfuncs is not None:
+                change[:] = True
+            else:
+                extras = (uxkinds == 3) | (uykinds == 3)
+                change |= extras[1:] | extras[:-1]
+
+            groupids = np.concatenate(([0], np.cumsum(change)))
+        else:
+            ign, groupids = np.unique(keys, axis=0, return_inverse=True)
+            groupids = groupids.ravel()
+
+        order = np.argsort(groupids, kind="stable")
+        breaks = np.flatnonzero(np.diff(groupids[order])) + 1
+
+        for idx in np.split(order, breaks):
+            i0 = idx[0]
+            gx = x[idx]
+            gy = y[idx]
+            fill = bool(fills[i0])
 
-        for i in range(x.size):
             ctxt.save()
 
-            if docnum:
-                if cnums[i] < 0:
-                    c = self.extracolors[-cnums[i] - 1]
-                else:
-                    c = style.colors.getDataColor(cnums[i])
+            if colors:
+                c = colors[int(colorids[i0])]
 
                 if len(c) == 4:
                     ctxt.set_source_rgba(*c)
                 else:
                     ctxt.set_source_rgb(*c)
-            elif domcolor:
-                ctxt.set_source_rgb(*rgbs[i])
 
-            if doshape:
-                symfunc = style.data.getStrictSymbolFunc(shapes[i])
-            else:
-                symfunc = style.data.getStrictSymbolFunc(self.fixedshape)
+            if ppfuncs is not None:
+                ppfunc = self.prepaintfuncs[ppfuncs[i0]]
 
-            if dosize:
-                size = sizes[i]
+                for px, py in zip(gx.tolist(), gy.tolist()):
+                    ppfunc(ctxt, style, px, py)
 
-            if dofill:
-                fill = fills[i]
+            sel = uxkinds[idx] == 3
 
-            if doux:
-                xls = xlimstyles[i]
+            if sel.any():
+                bars = uxs[:, idx[sel]]
+                _strokeSegments(
+                    ctxt, bars[0], gy[sel], bars[1], gy[sel], self.minBarLength
+                )
 
-                if xls == -1:
-                    uxkind = "u"  # upper limit
-                elif xls == 1:
-                    uxkind = "l"  # lower
-                elif uxs[0, i] == x[i] and uxs[1, i] == x[i]:
-                    uxkind = "n"  # none
-                else:
-                    uxkind = "b"  # error bars
+            sel = uykinds[idx] == 3
 
-            if douy:
-                yls = ylimstyles[i]
+            if sel.any():
+                bars = uys[:, idx[sel]]
+                _strokeSegments(
+                    ctxt, gx[sel], bars[0], gx[sel], bars[1], self.minBarLength
+                )
 
-                if yls == -1:
-                    uykind = "u"  # upper limit
-                elif yls == 1:
-                    uykind = "l"  # lower
-                elif uys[0, i] == y[i] and uys[1, i] == y[i]:
-                    uykind = "n"  # none
-                else:
-                    uykind = "b"  # error bars
+            kind, rot = limitinfo[limits[i0]]
+            gsizes = sizes[idx]
 
-            if uxkind == "u":
-                if uykind == "u":
-                    symfunc = _double_limit(0)
-                elif uykind == "l":
-                    symfunc = _double_limit(0.5 * np.pi)
-                else:
-                    symfunc = _single_limit(0.5 * np.pi)
-            elif uxkind == "l":
-                if uykind == "u":
-                    symfunc = _double_limit(-0.5 * np.pi)
-                elif uykind == "l":
-                    symfunc = _double_limit(np.pi)
-                else:
-                    symfunc = _single_limit(-0.5 * np.pi)
-            elif uykind == "u":
-                symfunc = _single_limit(0)
-            elif uykind == "l":
-                symfunc = _single_limit(np.pi)
-
-            if doprepaint:
-                self.prepaintfuncs[ppfuncs[i]](ctxt, style, x[i], y[i])
-
-            if uxkind == "b":
-                ctxt.move_to(uxs[0, i], y[i])
-                ctxt.line_to(uxs[1, i], y[i])
+            if kind is not None:
+                strokes, fillpaths = _limitOutlines[kind]
+                scale = gsizes * style.smallScale
+                cos = np.full(idx.size, np.cos(rot))
+                sin = np.full(idx.size, np.sin(rot))
+                _appendOutlines(ctxt, gx, gy, scale, cos, sin, strokes)
                 ctxt.stroke()
 
-            if uykind == "b":
-                ctxt.move_to(x[i], uys[0, i])
-                ctxt.line_to(x[i], uys[1, i])
-                ctxt.stroke()
+                if fill:
+                    _appendOutlines(ctxt, gx, gy, scale, cos, sin, fillpaths)
+                    ctxt.fill()
+            else:
+                symfunc = style.data.getStrictSymbolFunc(shapes[i0])
+                base = getattr(symfunc, "symFunc", None)
+                outline = _symbolOutlines.get(base)
+
+                if outline is None:
+                    for px, py, size in zip(gx.tolist(), gy.tolist(), gsizes.tolist()):
+                        ctxt.save()
+                        ctxt.translate(px, py)
+                        symfunc(ctxt, style, size, fill)
+                        ctxt.restore()
+                else:
+                    pp = _fillPainters[fill]
+
+                    if not _paintSprites(
+                        ctxt, style, base, outline, pp, gx, gy, gsizes, 0.0
+                    ):
+                        _paintSymbols(
+                            ctxt,
+                            style,
+                            outline,
+                            pp,
+                            gx,
+                            gy,
+                            gsizes,
+                            0.0,
+                            self.batchSize,
+                        )
 
-            ctxt.translate(x[i], y[i])
-            symfunc(ctxt, style, size, fill)
             ctxt.restore()
@@ -20,6 +20,8 @@
 Graphical styling classes.
 """
 
+from collections import OrderedDict
+
 import numpy as np
 
 
@@ -31,6 +33,9 @@ def apply_color(ctxt, c):
 
 
 class Style(object):
+    maxSprites = 512
+    _sprites = None
+
     def __init__(self, sizes, colors, data, roles):
         self.sizes = sizes
         self.colors = colors
@@ -111,6 +116,30 @@ class Style(object):
     def applyDataStamp(self, ctxt, dsn, modifiers={}):
         self.data.applyStamp(self, ctxt, dsn, modifiers)
 
+    def getSprite(self, key, render):
+        """Return the pre-rendered image identified by @key, calling
+        render() to create it if it isn't cached. Sprites are cached
+        separately for each Sizes object the style is used with, and the
+        least recently used ones are dropped once there are more than
+        maxSprites of them."""
+
+        if self._sprites is None:
+            self._sprites = OrderedDict()
+
+        key = (self.sizes,) + key
+        sprite = self._sprites.get(key)
+
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            return sprite
+
+        sprite = self._sprites[key] = render()
+
+        while len(self._sprites) > self.maxSprites:
+            self._sprites.popitem(last=False)
+
+        return sprite
+
     # Shortcut accessors for useful properties
 
     @property
@@ -269,17 +298,22 @@ class DataTheme(object):
 
 
 def _wfa(func):
-    # "with fill argument"
+    # "with fill argument"; the attribute lets stamps paint the symbol in batches.
     from .stamps import PathPainter
 
-    return lambda c, sty, sz, fill: func(c, sty, sz, PathPainter(fill=fill))
+    wrapped = lambda c, sty, sz, fill: func(c, sty, sz, PathPainter(fill=fill))
+    wrapped.symFunc = func
+    return wrapped
 
 
 def _wff(func, fill):
-    # "with fixed fill"
+    # "with fixed fill"; the attributes let stamps paint the symbol in batches.
     from .stamps import PathPainter
 
-    return lambda c, sty, sz: func(c, sty, sz, PathPainter(fill=fill))
+    wrapped = lambda c, sty, sz: func(c, sty, sz, PathPainter(fill=fill))
+    wrapped.symFunc = func
+    wrapped.pathPainter = PathPainter(fill=fill)
+    return wrapped
 
 
 class MonochromeDataTheme(DataTheme):
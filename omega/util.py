@@ -243,10 +243,35 @@ def quickContours(
 
 
 def quickImage(format, data):
-    from .rect import RectPlot, ImagePainter
+    from .rect import ImagePainter
+
+    return _imagePlot(ImagePainter().wrap(format, data))
+
+
+def quickColorImage(
+    data, cmin=None, cmax=None, stretch="linear", cmap="white_to_black"
+):
+    """Create a :class:`omega.rect.RectPlot` showing the 2D array *data*
+    through a colormap; see :func:`omega.colorize.dataToARGB32` for the
+    other arguments. The pixels are written straight into the image
+    surface."""
+    import cairo
+    from .colorize import dataToARGB32
+    from .rect import ImagePainter
+
+    if np.ndim(data) != 2:
+        raise ValueError("input array must be 2D")
+
+    ip = ImagePainter()
+    buf = ip.allocate(cairo.FORMAT_ARGB32, data.shape[1], data.shape[0])
+    dataToARGB32(data, cmin, cmax, stretch, cmap, out=buf)
+    return _imagePlot(ip)
+
+
+def _imagePlot(ip):
+    from .rect import RectPlot
 
     p = RectPlot()
-    ip = ImagePainter().wrap(format, data)
     # take advantage of any futzing of data done by wrap():
     width = ip.surface.get_width()
     height = ip.surface.get_height()
@@ -23,7 +23,9 @@ Derived from the algorithm in PGPLOT 5.2, available at:
 
 http://www.astro.caltech.edu/~tjp/pgplot/
 
-The relevant files are src/pgcnsc.f and src/pgcn01.f.
+The relevant files are src/pgcnsc.f and src/pgcn01.f. That algorithm
+survives as 'traceContourValue'; 'contourValue' is a vectorized
+reimplementation that produces the same contours much faster.
 
 FIXME: more docs.
 """
@@ -79,40 +81,10 @@ class _ArrayGrower(object):
         return ret
 
 
-def contourValue(data, rowcoords, colcoords, value):
-    """Compute contours of 2D array 'data', which describes data
-    points living on a regular grid. 'rowcoords' and 'colcoords' are
-    1D arrays giving the coordinate values of the first and second
-    indices of 'data', respectively. 'value' is the value to contour
-    for.
-
-    Returns a list of 2D arrays. The first dimension of each array is
-    of size 2. The second dimension is of variable size, depending on
-    how many points are needed to trace out the contour. array[0,:]
-    gives the *column* coordinates of the row points while array[1,:]
-    gives the *row* coordinates. This maps on to the usual sense of
-    [row,col] mapping to [y,x].
-
-    Contours are traced out clockwise around maxima that they contain,
-    or analogously counterclockwise around contained minima.
-
-    This may or may not be the "marching squares" algorithm.
-    """
-
-    # We visualize data as a rectangular box. The coordinates of data
-    # are [row,col].  The top-left corner is data[0,0]. data[0,ncol-1]
-    # is the top-right corner and data[nrow-1,0] is the bottom left
-    # corner. This leads to the familiar and annoying fact that
-    # data[row,col] is essentially data[y,x].
-
-    UP, RT, DN, LF = 0, 1, 2, 3
-
-    # Check args
-
+def _checkGridArgs(data, rowcoords, colcoords):
     data = np.asarray(data)
     rowcoords = np.asarray(rowcoords)
     colcoords = np.asarray(colcoords)
-    value = float(value)
 
     if data.ndim != 2:
         raise ValueError("Data must be 2D")
@@ -129,6 +101,37 @@ def contourValue(data, rowcoords, colcoords, value):
     if colcoords.size != data.shape[1]:
         raise ValueError("colcoords.size must = data.shape[1]")
 
+    return data, rowcoords, colcoords
+
+
+def traceContourValue(data, rowcoords, colcoords, value):
+    """Compute contours of 2D array 'data' by tracing them cell by
+    cell. This is the original pure-Python implementation of
+    'contourValue', which it documents; it is very slow on large
+    grids but is kept as a reference for checking the vectorized
+    engine.
+
+    The two agree except in one rare case: when a closed contour
+    returns to its starting edge through a saddle cell whose other
+    pair of crossings has not yet been visited, this tracer carries
+    on through the saddle rather than closing the loop. It also
+    handles NaN-valued data poorly: a contour that runs into NaNs is
+    closed back to wherever the tracer started following it, which
+    need not be one of its ends, and some of its crossings can be
+    dropped. 'contourValue' leaves such contours open at the NaNs.
+    """
+
+    # We visualize data as a rectangular box. The coordinates of data
+    # are [row,col].  The top-left corner is data[0,0]. data[0,ncol-1]
+    # is the top-right corner and data[nrow-1,0] is the bottom left
+    # corner. This leads to the familiar and annoying fact that
+    # data[row,col] is essentially data[y,x].
+
+    UP, RT, DN, LF = 0, 1, 2, 3
+
+    data, rowcoords, colcoords = _checkGridArgs(data, rowcoords, colcoords)
+    value = float(value)
+
     NR = data.shape[0]
     NC = data.shape[1]
 
@@ -344,7 +347,326 @@ def contourValue(data, rowcoords, colcoords, value):
     return contours
 
 
-def contourValues(data, rowcoords, colcoords, values):
+# Support for the vectorized engine. Cell sides are numbered T, B, L,
+# R. A contour entering a cell through a given side leaves through the
+# first side in its row of this table that is crossed at all. These
+# are the same choices that the reference tracer makes, and they keep
+# the higher values on the right-hand side (looking along the contour
+# with rows increasing downward) even in saddle cells.
+
+_T, _B, _L, _R = 0, 1, 2, 3
+_exitPriority = np.array(
+    [
+        [_L, _R, _B],  # entering through top, moving down
+        [_R, _L, _T],  # through bottom, moving up
+        [_B, _T, _R],  # through left, moving right
+        [_T, _B, _L],  # through right, moving left
+    ]
+)
+
+
+def _linkChains(nxt, key):
+    """Order the nodes of a successor graph into chains.
+
+    'nxt' gives the successor of each node, or -1 if it has none; no
+    two nodes may share a successor, so the graph is a set of open
+    chains and cycles. 'key' gives a distinct sort key for each node.
+    Cycles are opened just before their lowest-keyed node.
+
+    Returns (order, starts, closed): 'order' lists the nodes chain by
+    chain, sorted by the key of each chain's first node; 'starts'
+    gives the offset of each chain in 'order'; and 'closed' says
+    whether it came from a cycle. Everything is done by pointer
+    doubling, so the cost is O(n log n) array operations without any
+    per-node Python.
+    """
+    n = nxt.size
+    nodes = np.arange(n)
+
+    # Find the cycles and the lowest key in each. Node n is a sentinel
+    # that open chains eventually reach.
+
+    succ = np.append(np.where(nxt < 0, n, nxt), n)
+    low = np.append(key, key.max() + 1)
+    span = 1
+
+    while span < n:
+        low = np.minimum(low, low[succ])
+        succ = succ[succ]
+        span *= 2
+
+    closed = succ[:n] != n
+    low = low[:n]
+
+    # Break each cycle just before its lowest-keyed node, then rank
+    # every node by its distance from the head of its chain.
+
+    nxt = nxt.copy()
+    target = np.maximum(nxt, 0)
+    nxt[closed & (key[target] == low[target])] = -1
+
+    pred = np.full(n, -1)
+    hasNext = nxt >= 0
+    pred[nxt[hasNext]] = nodes[hasNext]
+
+    head = np.where(pred < 0, nodes, pred)
+    rank = (pred >= 0).astype(int)
+    span = 1
+
+    while span < n:
+        rank += rank[head]
+        head = head[head]
+        span *= 2
+
+    order = np.lexsort((rank, key[head]))
+    starts = np.flatnonzero(rank[order] == 0)
+    return order, starts, closed[order[starts]]
+
+
+def _crossingLinks(data, rowcoords, colcoords, value, r0=0, c0=0, shape=None):
+    """Find the crossings of 'value' in a tile of a grid and link each to
+    the next crossing along its contour.
+
+    'data' holds rows r0 onward and columns c0 onward of a grid of
+    shape 'shape' (by default, the tile is the whole grid), and
+    'rowcoords' and 'colcoords' give the tile's coordinates. Edges are
+    numbered across the whole grid, with the "h" edges (between rows i
+    and i + 1 of column j) first, then the "v" edges (between columns j
+    and j + 1 of row i).
+
+    Returns (edges, x, y, nxt, key): the ids of the crossed edges, the
+    interpolated vertices, the id of the next crossed edge along each
+    contour (-1 at the ends) and the sort key used to order contours.
+    A crossing is only returned by the tile containing the cell that
+    its contour goes on into, or by the one containing it if the
+    contour leaves the grid there. If tiles overlap by one row and
+    column, every crossing is therefore returned exactly once.
+    """
+    nr, nc = data.shape
+    NR, NC = data.shape if shape is None else shape
+    NH = (NR - 1) * NC
+
+    # An edge between two grid points is crossed if exactly one of them
+    # is >= value; NaNs never give crossings.
+
+    valid = ~np.isnan(data)
+    with np.errstate(invalid="ignore"):
+        high = data >= value
+
+    hcross = (high[:-1] != high[1:]) & valid[:-1] & valid[1:]
+    vcross = (high[:, :-1] != high[:, 1:]) & valid[:, :-1] & valid[:, 1:]
+    nh = hcross.size
+    local = np.flatnonzero(np.concatenate((hcross.ravel(), vcross.ravel())))
+    n = local.size
+
+    nodeOf = np.full(nh + vcross.size, -1)
+    nodeOf[local] = np.arange(n)
+    ish = local < nh
+    isv = ~ish
+
+    i = np.empty(n, dtype=int)
+    j = np.empty(n, dtype=int)
+    i[ish], j[ish] = np.divmod(local[ish], nc)
+    i[isv], j[isv] = np.divmod(local[isv] - nh, nc - 1)
+
+    # Interpolated vertices.
+
+    x = np.empty(n)
+    y = np.empty(n)
+
+    hi, hj = i[ish], j[ish]
+    d0 = data[hi, hj]
+    d1 = data[hi + 1, hj]
+    x[ish] = colcoords[hj]
+    y[ish] = rowcoords[hi] + (rowcoords[hi + 1] - rowcoords[hi]) / (d1 - d0) * (
+        value - d0
+    )
+
+    vi, vj = i[isv], j[isv]
+    d0 = data[vi, vj]
+    d1 = data[vi, vj + 1]
+    x[isv] = colcoords[vj] + (colcoords[vj + 1] - colcoords[vj]) / (d1 - d0) * (
+        value - d0
+    )
+    y[isv] = rowcoords[vi]
+
+    # Each crossing is traversed so that the high side is on the right,
+    # which determines the cell that the contour enters next and the
+    # side it enters through.
+
+    hfirst = high[i, j]
+    ci = i - (isv & ~hfirst)
+    cj = j - (ish & hfirst)
+    entry = np.where(ish, np.where(hfirst, _R, _L), np.where(hfirst, _T, _B))
+    inTile = (ci >= 0) & (ci < nr - 1) & (cj >= 0) & (cj < nc - 1)
+
+    gi = i + r0
+    gj = j + c0
+    gci = ci + r0
+    gcj = cj + c0
+    inGrid = (gci >= 0) & (gci < NR - 1) & (gcj >= 0) & (gcj < NC - 1)
+    edges = np.where(ish, gi * NC + gj, NH + gi * (NC - 1) + gj)
+
+    # Link each crossing to the next one along its contour.
+
+    ci = np.clip(ci, 0, nr - 2)
+    cj = np.clip(cj, 0, nc - 2)
+    sides = np.stack(
+        (
+            nh + ci * (nc - 1) + cj,
+            nh + (ci + 1) * (nc - 1) + cj,
+            ci * nc + cj,
+            ci * nc + cj + 1,
+        ),
+        axis=1,
+    )
+    cands = np.take_along_axis(nodeOf[sides], _exitPriority[entry], axis=1)
+    found = cands >= 0
+    nxt = cands[np.arange(n), found.argmax(axis=1)]
+    nxt = np.where(inTile & found.any(axis=1), edges[nxt], -1)
+
+    # Crossings whose contours enter the grid from outside are where
+    # the reference tracer starts, in the order top, right, bottom,
+    # left; everything else is ordered by edge id.
+
+    m = max(NR, NC)
+    key = 4 * m + edges
+    stages = [
+        (isv & (gi == 0) & hfirst, 0, gj),
+        (ish & (gj == NC - 1) & hfirst, 1, gi),
+        (isv & (gi == NR - 1) & ~hfirst, 2, gj),
+        (ish & (gj == 0) & ~hfirst, 3, gi),
+    ]
+
+    for where, stage, pos in stages:
+        key[where] = stage * m + pos[where]
+
+    emit = inTile | ~inGrid
+    return edges[emit], x[emit], y[emit], nxt[emit], key[emit]
+
+
+def _assembleContours(edges, x, y, nxt, key):
+    """Resolve crossings linked by '_crossingLinks' into the list of
+    contour arrays returned by 'contourValue'. The crossings need not
+    be sorted."""
+    if edges.size == 0:
+        return []
+
+    sort = np.argsort(edges, kind="stable")
+    edges, x, y, nxt, key = edges[sort], x[sort], y[sort], nxt[sort], key[sort]
+    nxt = np.where(nxt < 0, -1, np.searchsorted(edges, nxt))
+
+    order, starts, closed = _linkChains(nxt, key)
+    contours = []
+
+    for idx, isClosed in zip(np.split(order, starts[1:]), closed):
+        if isClosed:
+            idx = np.append(idx, idx[0])
+        contours.append(np.vstack((x[idx], y[idx])))
+
+    return contours
+
+
+def contourValue(data, rowcoords, colcoords, value):
+    """Compute contours of 2D array 'data', which describes data
+    points living on a regular grid. 'rowcoords' and 'colcoords' are
+    1D arrays giving the coordinate values of the first and second
+    indices of 'data', respectively. 'value' is the value to contour
+    for.
+
+    Returns a list of 2D arrays. The first dimension of each array is
+    of size 2. The second dimension is of variable size, depending on
+    how many points are needed to trace out the contour. array[0,:]
+    gives the *column* coordinates of the row points while array[1,:]
+    gives the *row* coordinates. This maps on to the usual sense of
+    [row,col] mapping to [y,x].
+
+    Contours are traced out clockwise around maxima that they contain,
+    or analogously counterclockwise around contained minima. Closed
+    contours repeat their first point at the end. Contours that start
+    on the edges of the grid come first, then closed ones.
+
+    This is a vectorized "marching squares": all of the crossings for
+    the level are found at once, each is linked to the next one along
+    its contour with array operations, and the links are then resolved
+    into polylines. The results match those of 'traceContourValue'
+    except in the corner cases described there.
+    """
+    data, rowcoords, colcoords = _checkGridArgs(data, rowcoords, colcoords)
+    return _assembleContours(*_crossingLinks(data, rowcoords, colcoords, float(value)))
+
+
+def _uniqueValues(values):
+    uniq = []
+
+    for v in values:
+        if v not in uniq:
+            uniq.append(v)
+
+    return uniq
+
+
+def _shareGrid(data):
+    """Copy 'data' into a new shared memory block, which the caller must
+    close and unlink."""
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+    np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)[...] = data
+    return shm
+
+
+def _attachGrid(shmName):
+    from multiprocessing import shared_memory
+
+    try:
+        # Python >= 3.13: don't let the worker's resource tracker claim
+        # the block, which the parent owns.
+        return shared_memory.SharedMemory(name=shmName, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=shmName)
+
+
+def _runTasks(func, tasks, workers, executor):
+    """Run func(*args) for each of 'tasks' on 'executor', or on a process
+    pool of 'workers' processes, and return the results in order."""
+    ownExecutor = executor is None
+
+    if ownExecutor:
+        from concurrent.futures import ProcessPoolExecutor
+
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(tasks)))
+
+    try:
+        futures = [executor.submit(func, *args) for args in tasks]
+        return [f.result() for f in futures]
+    finally:
+        if ownExecutor:
+            executor.shutdown()
+
+
+def _contourShared(shmName, shape, dtype, rowcoords, colcoords, value):
+    """Worker for parallel 'contourValues': contour a grid that lives
+    in a shared memory block."""
+    shm = _attachGrid(shmName)
+
+    try:
+        return contourValue(
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf), rowcoords, colcoords, value
+        )
+    finally:
+        shm.close()
+
+
+def contourValues(
+    data,
+    rowcoords,
+    colcoords,
+    values,
+    workers=None,
+    executor=None,
+    tileShape=None,
+):
     """Compute contours of the 2D array 'data' at multiple
     values. See documentation for the function 'contourValue' for
     documentation of arguments. 'values' is an iterable of values
@@ -352,21 +674,434 @@ def contourValues(data, rowcoords, colcoords, values):
 
     Returns a dictionary mapping from each distinct value in 'values'
     into a list of 2D arrays as returned by 'contourValue'. If a value
-    is listed repeatedly in 'values', it is contoured only once.
+    is listed repeatedly in 'values', it is contoured only once. The
+    dictionary is ordered by first appearance in 'values'.
+
+    The levels are independent, so they can be computed in parallel.
+    If 'workers' is greater than 1, a process pool of that size is
+    used for the duration of the call; alternatively, 'executor' can
+    be any concurrent.futures executor, which is left running. In
+    either case 'data' is copied once into shared memory so that it
+    isn't pickled for each level, and the results are identical to
+    those of the serial computation.
+
+    If 'tileShape' is given, the grid is contoured in tiles; see
+    'contourTiled'.
     """
 
-    retval = {}
+    if tileShape is not None:
+        return contourTiled(
+            data,
+            rowcoords,
+            colcoords,
+            values,
+            tileShape=tileShape,
+            workers=workers,
+            executor=executor,
+        )
 
-    for v in values:
-        if v in retval:
-            continue
+    uniq = _uniqueValues(values)
+
+    if executor is None and (workers is None or workers < 2 or len(uniq) < 2):
+        return dict((v, contourValue(data, rowcoords, colcoords, v)) for v in uniq)
+
+    data, rowcoords, colcoords = _checkGridArgs(data, rowcoords, colcoords)
+    shm = _shareGrid(data)
+
+    try:
+        tasks = [
+            (shm.name, data.shape, data.dtype.str, rowcoords, colcoords, v)
+            for v in uniq
+        ]
+        results = _runTasks(_contourShared, tasks, workers, executor)
+    finally:
+        shm.close()
+        shm.unlink()
 
-        retval[v] = contourValue(data, rowcoords, colcoords, v)
+    return dict(zip(uniq, results))
+
+
+def _tileLinks(source, bounds, rowcoords, colcoords, values, shape):
+    """Worker for 'contourTiled': read one tile of the grid described by
+    'source' and link its crossings at each of 'values'. 'rowcoords' and
+    'colcoords' are those of the tile."""
+    r0, r1, c0, c1 = bounds
+    shm = None
+
+    if source[0] == "memmap":
+        filename, dtype, mshape, offset, order = source[1:]
+        data = np.memmap(
+            filename, dtype=dtype, mode="r", shape=mshape, offset=offset, order=order
+        )
+    elif source[0] == "shm":
+        shm = _attachGrid(source[1])
+        data = np.ndarray(source[2], dtype=source[3], buffer=shm.buf)
+    else:
+        data = source[1]
+
+    try:
+        tile = np.array(data[r0 : r1 + 1, c0 : c1 + 1])
+    finally:
+        del data
+        if shm is not None:
+            shm.close()
+
+    return [
+        _crossingLinks(tile, rowcoords, colcoords, float(v), r0, c0, shape)
+        for v in values
+    ]
+
+
+def contourTiled(
+    data,
+    rowcoords,
+    colcoords,
+    values,
+    tileShape=(1024, 1024),
+    workers=None,
+    executor=None,
+):
+    """Compute contours of the 2D array 'data' at multiple values,
+    working through the grid a tile at a time. The arguments and
+    return value are as for 'contourValues', and the contours are
+    identical to the ones it computes.
+
+    'tileShape' gives the number of (rows, columns) of grid cells in
+    each tile. Neighboring tiles share their edge row or column of grid
+    points, and each crossing is linked within the tile that its
+    contour continues into, so contours are stitched across tiles
+    exactly. Only one tile of 'data' is read into memory at a time; the
+    rest of the memory used scales with the number of crossings. This
+    makes it possible to contour a numpy.memmap that doesn't fit into
+    memory.
+
+    The tiles can be processed in parallel as for 'contourValues'.
+    Workers reopen a memmap themselves; other arrays are copied into
+    shared memory once.
+    """
+    import mmap
+
+    mapped = isinstance(data, np.memmap) and isinstance(data.base, mmap.mmap)
+    source = data
+    data, rowcoords, colcoords = _checkGridArgs(data, rowcoords, colcoords)
+    NR, NC = data.shape
+    th, tw = max(int(tileShape[0]), 1), max(int(tileShape[1]), 1)
+    uniq = _uniqueValues(values)
+
+    tasks = []
+
+    for r0 in range(0, NR - 1, th):
+        r1 = min(r0 + th, NR - 1)
+
+        for c0 in range(0, NC - 1, tw):
+            c1 = min(c0 + tw, NC - 1)
+            tasks.append(
+                [
+                    None,
+                    (r0, r1, c0, c1),
+                    rowcoords[r0 : r1 + 1],
+                    colcoords[c0 : c1 + 1],
+                    uniq,
+                    data.shape,
+                ]
+            )
+
+    parallel = executor is not None or (
+        workers is not None and workers > 1 and len(tasks) > 1
+    )
+    shm = None
+
+    if not parallel:
+        source = ("array", data)
+    elif mapped:
+        if source.flags.f_contiguous and not source.flags.c_contiguous:
+            order = "F"
+        else:
+            order = "C"
+
+        source = (
+            "memmap",
+            source.filename,
+            source.dtype.str,
+            source.shape,
+            source.offset,
+            order,
+        )
+    else:
+        shm = _shareGrid(data)
+        source = ("shm", shm.name, data.shape, data.dtype.str)
+
+    for task in tasks:
+        task[0] = source
+
+    try:
+        if parallel:
+            results = _runTasks(_tileLinks, tasks, workers, executor)
+        else:
+            results = [_tileLinks(*task) for task in tasks]
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    retval = {}
+
+    for k, v in enumerate(uniq):
+        links = zip(*[r[k] for r in results])
+        retval[v] = _assembleContours(*[np.concatenate(a) for a in links])
 
     return retval
 
 
-__all__ = ["contourValue", "contourValues"]
+# Bump this whenever the contouring engine or the cache file format
+# changes, so that stale results on disk are no longer found.
+_cacheVersion = 1
+
+
+class ContourCache(object):
+    """A cache of contouring results, so that scripts that are re-run
+    many times don't re-contour the same grids.
+
+    Results are stored per level, keyed by a hash of the data buffer,
+    the row and column coordinates, and the level value. They are kept
+    in an in-memory LRU of at most 'maxBytes' bytes of vertex data
+    and, if 'directory' is given, also as compact .npz files there,
+    which persist between processes. If 'maxDiskBytes' is set, the
+    least recently used files are deleted to stay under it.
+
+    Use it via the 'cache' argument to 'contourAuto' (and so
+    GridContours.setData, RectPlot.addContours, etc.) or by calling
+    its 'contourValues' method. The counters 'hits', 'diskHits' and
+    'misses' count levels; 'stats()' summarizes them. Cached arrays
+    are read-only since they are shared between callers. Damaged cache
+    files are deleted and treated as misses.
+    """
+
+    maxBytes = 256 * 1024 * 1024
+    maxDiskBytes = None
+
+    def __init__(self, directory=None, maxBytes=None, maxDiskBytes=None):
+        from collections import OrderedDict
+
+        self.directory = directory
+        if maxBytes is not None:
+            self.maxBytes = maxBytes
+        if maxDiskBytes is not None:
+            self.maxDiskBytes = maxDiskBytes
+
+        self._mem = OrderedDict()
+        self._memBytes = 0
+        self.hits = self.diskHits = self.misses = self.evictions = 0
+
+        if directory is not None:
+            import os
+
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def gridKey(data, rowcoords, colcoords):
+        """Return a hex digest identifying a grid and its coordinates."""
+        import hashlib
+
+        h = hashlib.blake2b(digest_size=20)
+        h.update(b"contourgrid-%d;" % _cacheVersion)
+
+        for a in data, rowcoords, colcoords:
+            a = np.ascontiguousarray(a)
+            h.update(("%s%r" % (a.dtype.str, a.shape)).encode("ascii"))
+            h.update(a)
+
+        return h.hexdigest()
+
+    @staticmethod
+    def levelKey(gridKey, value):
+        return "%s-%s" % (gridKey, float(value).hex())
+
+    def _path(self, key):
+        import os
+
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, key):
+        """Return the cached contours for 'key', or None."""
+        contours = self._mem.get(key)
+
+        if contours is not None:
+            self._mem.move_to_end(key)
+            self.hits += 1
+            return list(contours)
+
+        if self.directory is not None:
+            import os
+            import zipfile
+            import zlib
+
+            path = self._path(key)
+
+            try:
+                with np.load(path) as f:
+                    xy, lengths = f["xy"], f["lengths"]
+            except FileNotFoundError:
+                pass
+            except (
+                OSError,
+                EOFError,
+                KeyError,
+                ValueError,
+                zipfile.BadZipFile,
+                zlib.error,
+            ):
+                # A damaged file, perhaps from a crash mid-write; it will be
+                # replaced when the level is recomputed.
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            else:
+                os.utime(path)
+
+                if lengths.size:
+                    contours = np.split(xy, np.cumsum(lengths)[:-1], axis=1)
+                else:
+                    # np.split would give one empty piece.
+                    contours = []
+
+                self._remember(key, contours)
+                self.diskHits += 1
+                return list(contours)
+
+        self.misses += 1
+        return None
+
+    def put(self, key, contours):
+        """Store the list of contour arrays 'contours' under 'key', returning
+        the read-only copies that were cached."""
+        contours = [np.array(c, dtype=float) for c in contours]
+        self._remember(key, contours)
+
+        if self.directory is not None:
+            self._write(key, contours)
+
+        return list(contours)
+
+    def _remember(self, key, contours):
+        for c in contours:
+            c.flags.writeable = False
+
+        old = self._mem.pop(key, None)
+        if old is not None:
+            self._memBytes -= sum(c.nbytes for c in old)
+
+        self._mem[key] = contours
+        self._memBytes += sum(c.nbytes for c in contours)
+
+        while self._memBytes > self.maxBytes and len(self._mem) > 1:
+            _, old = self._mem.popitem(last=False)
+            self._memBytes -= sum(c.nbytes for c in old)
+            self.evictions += 1
+
+    def _write(self, key, contours):
+        import os
+        import tempfile
+
+        if len(contours):
+            xy = np.concatenate(contours, axis=1)
+        else:
+            xy = np.empty((2, 0))
+
+        lengths = np.array([c.shape[1] for c in contours], dtype=np.int64)
+        fd, tmp = tempfile.mkstemp(suffix=".npz", dir=self.directory)
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, xy=xy, lengths=lengths)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+        if self.maxDiskBytes is not None:
+            self._trimDisk()
+
+    def _trimDisk(self):
+        import os
+
+        entries = []
+
+        for e in os.scandir(self.directory):
+            if e.name.endswith(".npz") and e.is_file():
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+
+        entries.sort()
+        total = sum(e[1] for e in entries)
+
+        for mtime, size, path in entries[:-1]:
+            if total <= self.maxDiskBytes:
+                break
+
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+
+            total -= size
+            self.evictions += 1
+
+    def clear(self, disk=False):
+        """Empty the in-memory cache and, if 'disk', the directory."""
+        self._mem.clear()
+        self._memBytes = 0
+
+        if disk and self.directory is not None:
+            import os
+
+            for e in os.scandir(self.directory):
+                if e.name.endswith(".npz"):
+                    os.unlink(e.path)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "diskHits": self.diskHits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._mem),
+            "bytes": self._memBytes,
+        }
+
+    def contourValues(self, data, rowcoords, colcoords, values, **kwargs):
+        """Like the module-level 'contourValues', which receives any
+        keyword arguments, but only levels that aren't cached are
+        computed."""
+        gkey = self.gridKey(*_checkGridArgs(data, rowcoords, colcoords))
+        retval = {}
+        missing = []
+
+        for v in values:
+            if v in retval:
+                continue
+
+            retval[v] = self.get(self.levelKey(gkey, v))
+            if retval[v] is None:
+                missing.append(v)
+
+        if len(missing):
+            computed = contourValues(data, rowcoords, colcoords, missing, **kwargs)
+
+            for v, contours in computed.items():
+                retval[v] = self.put(self.levelKey(gkey, v), contours)
+
+        return retval
+
+
+__all__ = [
+    "contourValue",
+    "traceContourValue",
+    "contourValues",
+    "contourTiled",
+    "ContourCache",
+]
 
 
 # Functions for generating helpful 'values' arrays.
@@ -429,6 +1164,10 @@ def contourAuto(
     values=None,
     frms=3,
     fmax=0.75,
+    workers=None,
+    executor=None,
+    tileShape=None,
+    cache=None,
 ):
     """Compute contours of the 2D array 'data', which describes data
     points living on a regular grid. 'rowcoords' and 'colcoords' are
@@ -449,6 +1188,14 @@ def contourAuto(
 
     'fmax': use fmax * max(data) for the upper bound in RMS/Max
 
+    'workers', 'executor': compute the levels in parallel; see
+      'contourValues'
+
+    'tileShape': work through the grid in tiles of this many cells;
+      see 'contourTiled'
+
+    'cache': a ContourCache to look up and store the results in
+
     Returns a dict of lists of arrays, {value: [contour1,
     ...contourN]}
 
@@ -475,7 +1222,12 @@ def contourAuto(
         elif space == "log":
             values = valsLogRange(r[0], r[1], pad, n)
 
-    return contourValues(data, rowcoords, colcoords, values)
+    kwargs = dict(workers=workers, executor=executor, tileShape=tileShape)
+
+    if cache is not None:
+        return cache.contourValues(data, rowcoords, colcoords, values, **kwargs)
+
+    return contourValues(data, rowcoords, colcoords, values, **kwargs)
 
 
 __all__ += [
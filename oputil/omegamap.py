@@ -86,13 +86,13 @@ locator=
 
 import sys
 
-import cairo
 import numpy as np
-from pwkit import astimage, astutil, cli, data_gui_helpers, ellipses
+from pwkit import astimage, astutil, cli, ellipses
 from pwkit.kwargv import ParseKeywords, Custom
 
 import omega as om
 import omega.astimage
+import omega.coordgrid
 import omega.pango_g3 as ompango
 
 
@@ -187,21 +187,20 @@ def plot(config):
     print("Raw data bounds:", data.min(), data.max())
 
     if config.logfactor is not None:
-        # TODO: switch to using the 'stretch' keyword of data_to_argb32() or
+        # TODO: switch to using the 'stretch' keyword of dataToARGB32() or
         # something along those lines.
         q = config.logfactor * (1 - np.median(data))
         print("Magic q:", q)
         assert data.min() > -q, "Can't logify it"
         data = np.log(data + q)
 
-    argb32 = data_gui_helpers.data_to_argb32(
-        data, cmin=config.range[0], cmax=config.range[1], cmap=config.coloring
-    )
-
     # Draw!
 
-    p = om.quickImage(cairo.FORMAT_ARGB32, argb32)
+    p = om.quickColorImage(
+        data, cmin=config.range[0], cmax=config.range[1], cmap=config.coloring
+    )
     coords = omega.astimage.AstimageCoordinates(im, p)
+    coords = omega.coordgrid.InterpolatedCoordinates(coords)
     p.paintCoordinates(coords)
     p.setLabels(config.xlabel, config.ylabel)
 
@@ -0,0 +1,185 @@
+# -*- mode: python; coding: utf-8 -*-
+# Copyright Peter Williams <peter@newton.cx> and collaborators.
+# Licensed under the MIT License.
+
+import numpy as np
+import pytest
+
+from oputil.contourgrid import (
+    ContourCache,
+    contourTiled,
+    contourValue,
+    contourValues,
+    traceContourValue,
+)
+
+
+def _randomGrid(seed, shape=(12, 15), nanFraction=0):
+    rng = np.random.default_rng(seed)
+    data = rng.normal(size=shape)
+    data[rng.random(shape) < nanFraction] = np.nan
+    rowcoords = np.cumsum(rng.uniform(0.5, 1.5, shape[0]))
+    colcoords = np.cumsum(rng.uniform(0.5, 1.5, shape[1]))
+    return data, rowcoords, colcoords
+
+
+def _smoothGrid():
+    rowcoords = np.linspace(-2, 2, 41)
+    colcoords = np.linspace(-3, 3, 53)
+    y, x = np.meshgrid(rowcoords, colcoords, indexing="ij")
+    data = (
+        np.exp(-((x - 1) ** 2 + y**2))
+        - 0.7 * np.exp(-((x + 1) ** 2 + (y - 0.5) ** 2) / 0.5)
+        + 0.1 * np.sin(3 * x) * np.cos(2 * y)
+    )
+    return data, rowcoords, colcoords
+
+
+_randomLevels = [-1.0, -0.2, 0.1, 0.8]
+_smoothLevels = [-0.5, -0.1, 0.05, 0.3, 0.7]
+
+
+def _cases():
+    for seed in range(10):
+        data, rowcoords, colcoords = _randomGrid(seed)
+        yield data, rowcoords, colcoords, _randomLevels
+
+    yield _smoothGrid() + (_smoothLevels,)
+
+
+def _assertSameContours(found, expected):
+    # Same contours, in the same order, traced in the same direction.
+    assert len(found) == len(expected)
+
+    for f, e in zip(found, expected):
+        assert f.shape == e.shape
+        np.testing.assert_allclose(f, e, rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("case", list(range(11)))
+def test_matches_tracer(case):
+    data, rowcoords, colcoords, levels = list(_cases())[case]
+    expected = dict(
+        (v, traceContourValue(data, rowcoords, colcoords, v)) for v in levels
+    )
+
+    for v in levels:
+        _assertSameContours(contourValue(data, rowcoords, colcoords, v), expected[v])
+
+    tiled = contourTiled(data, rowcoords, colcoords, levels, tileShape=(5, 7))
+    assert list(tiled) == levels
+
+    for v in levels:
+        _assertSameContours(tiled[v], expected[v])
+
+
+def test_parallel_matches_tracer():
+    data, rowcoords, colcoords = _smoothGrid()
+    result = contourValues(data, rowcoords, colcoords, _smoothLevels, workers=2)
+    assert list(result) == _smoothLevels
+
+    for v in _smoothLevels:
+        _assertSameContours(result[v], traceContourValue(data, rowcoords, colcoords, v))
+
+
+def _crossings(data, rowcoords, colcoords, value):
+    """Every crossing of 'value' on an edge between two finite grid
+    points, mapped to the cells on either side of its edge."""
+    nr, nc = data.shape
+    result = {}
+
+    def crosses(d0, d1):
+        return np.isfinite(d0) and np.isfinite(d1) and (d0 >= value) != (d1 >= value)
+
+    for i in range(nr):
+        for j in range(nc):
+            if i < nr - 1 and crosses(data[i, j], data[i + 1, j]):
+                d0, d1 = data[i, j], data[i + 1, j]
+                y = rowcoords[i] + (rowcoords[i + 1] - rowcoords[i]) / (d1 - d0) * (
+                    value - d0
+                )
+                result[colcoords[j], y] = [(i, j - 1), (i, j)]
+
+            if j < nc - 1 and crosses(data[i, j], data[i, j + 1]):
+                d0, d1 = data[i, j], data[i, j + 1]
+                x = colcoords[j] + (colcoords[j + 1] - colcoords[j]) / (d1 - d0) * (
+                    value - d0
+                )
+                result[x, rowcoords[i]] = [(i - 1, j), (i, j)]
+
+    for key, cells in result.items():
+        result[key] = [(i, j) for i, j in cells if 0 <= i < nr - 1 and 0 <= j < nc - 1]
+
+    return result
+
+
+def test_nan_contours_stop_open():
+    # NaNs never give crossings, so contours can't continue past
+    # them. The vectorized engines return every crossing
+    # exactly once, leaving contours that run into NaNs open there; the
+    # reference tracer instead closes them back to where it started
+    # following them, and can miss some of their crossings entirely.
+
+    nOpenAtNan = 0
+
+    for seed in range(20):
+        data, rowcoords, colcoords = _randomGrid(seed, nanFraction=0.05)
+        finite = np.isfinite(data)
+        cellFinite = (
+            finite[:-1, :-1] & finite[1:, :-1] & finite[:-1, 1:] & finite[1:, 1:]
+        )
+
+        for v in _randomLevels:
+            crossings = _crossings(data, rowcoords, colcoords, v)
+            contours = contourValue(data, rowcoords, colcoords, v)
+            seen = []
+
+            for c in contours:
+                points = [tuple(p) for p in c.T]
+                closed = len(points) > 2 and points[0] == points[-1]
+
+                if closed:
+                    points = points[:-1]
+
+                seen += points
+
+                # Each step runs across a single cell.
+
+                steps = zip(points, points[1:] + points[:1] if closed else points[1:])
+
+                for p, q in steps:
+                    assert set(crossings[p]) & set(crossings[q])
+
+                # Open contours end at the edge of the grid or of the
+                # data.
+
+                if not closed:
+                    for p in points[0], points[-1]:
+                        cells = crossings[p]
+                        assert len(cells) < 2 or not all(cellFinite[c] for c in cells)
+                        nOpenAtNan += len(cells) == 2
+
+            assert sorted(seen) == sorted(crossings)
+
+            traced = traceContourValue(data, rowcoords, colcoords, v)
+            assert set(tuple(p) for c in traced for p in c.T) <= set(crossings)
+
+            tiled = contourTiled(data, rowcoords, colcoords, [v], tileShape=(5, 7))
+            _assertSameContours(tiled[v], contours)
+
+    assert nOpenAtNan > 0
+
+
+def test_cache_round_trip(tmp_path):
+    data, rowcoords, colcoords = _smoothGrid()
+    levels = [0.0, 100.0]
+    computed = ContourCache(tmp_path).contourValues(data, rowcoords, colcoords, levels)
+    assert computed[100.0] == []
+
+    cache = ContourCache(tmp_path)
+    reread = cache.contourValues(data, rowcoords, colcoords, levels)
+    assert cache.diskHits == 2
+    assert reread[100.0] == []
+
+    for v in levels:
+        _assertSameContours(reread[v], computed[v])
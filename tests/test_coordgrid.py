@@ -0,0 +1,103 @@
+# -*- mode: python; coding: utf-8 -*-
+# Copyright Peter Williams <peter@newton.cx> and collaborators.
+# Licensed under the MIT License.
+
+import warnings
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cairo")
+
+from omega import rect
+from omega.coordgrid import InterpolatedCoordinates
+from omega.sinproj import SphereSinProjection
+
+
+class _Axis(object):
+    def __init__(self, min, max):
+        self.min = min
+        self.max = max
+
+
+class _Field(object):
+    def __init__(self, x0, x1, y0, y1):
+        self.xaxis = _Axis(x0, x1)
+        self.yaxis = _Axis(y0, y1)
+
+
+def _randomPoints(field, n=5000):
+    rng = np.random.default_rng(0)
+    x = rng.uniform(field.xaxis.min, field.xaxis.max, n)
+    y = rng.uniform(field.yaxis.min, field.yaxis.max, n)
+    return x, y
+
+
+def _assertWithinTolerance(approx, exact, tolerance):
+    span = np.ptp(exact, axis=1)[:, np.newaxis]
+    assert np.all(np.abs(approx - exact) <= tolerance * span)
+
+
+def test_sin_tolerance():
+    field = _Field(-0.3, 0.31, -0.2, 0.25)
+    base = SphereSinProjection(1.0, 0.5, field)
+    coords = InterpolatedCoordinates(base)
+    x, y = _randomPoints(field)
+
+    arb = base.lin2arb(x, y)
+    _assertWithinTolerance(coords.lin2arb(x, y), arb, coords.tolerance)
+    lin = np.array([x, y])
+    _assertWithinTolerance(coords.arb2lin(*arb), lin, coords.tolerance)
+    assert coords.nExact == 0
+
+
+def test_sin_past_limb():
+    field = _Field(-0.6, 1.05, -0.5, 0.5)
+    base = SphereSinProjection(1.0, 0.5, field)
+    coords = InterpolatedCoordinates(base)
+    x, y = _randomPoints(field)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        approx = coords.lin2arb(x, y)
+        exact = base.lin2arb(x, y)
+
+    onsky = np.hypot(x, y) < 1
+    assert coords.nInterpolated > 0.5 * onsky.sum()
+    _assertWithinTolerance(approx[:, onsky], exact[:, onsky], coords.tolerance)
+    assert np.all(np.isnan(approx[:, ~onsky]))
+
+
+class _WrappedLongitude(rect.RectCoordinates):
+    def lin2arb(self, linx, liny):
+        linx, liny = np.broadcast_arrays(np.atleast_1d(linx), np.atleast_1d(liny))
+        return np.array([np.mod(0.2 - 1e-3 * linx, 2 * np.pi), 0.3 + 1e-3 * liny])
+
+    def arb2lin(self, arbx, arby):
+        arbx, arby = np.broadcast_arrays(np.atleast_1d(arbx), np.atleast_1d(arby))
+        return np.array([(0.2 - arbx) / 1e-3, (arby - 0.3) / 1e-3])
+
+
+def test_discontinuity_falls_back():
+    field = _Field(0, 399, 0, 299)
+    base = _WrappedLongitude(field)
+    coords = InterpolatedCoordinates(base)
+    x, y = _randomPoints(field)
+
+    np.testing.assert_allclose(coords.lin2arb(x, y), base.lin2arb(x, y), atol=1e-9)
+    assert coords.nExact > 0
+    assert coords.nInterpolated > 0
+
+
+def test_jacobian_forwarded():
+    field = _Field(-0.3, 0.31, -0.2, 0.25)
+    base = SphereSinProjection(1.0, 0.5, field)
+    coords = InterpolatedCoordinates(base)
+    x, y = _randomPoints(field, 20)
+
+    np.testing.assert_array_equal(
+        coords.lin2arbJacobian(x, y), base.lin2arbJacobian(x, y)
+    )
+    assert (
+        InterpolatedCoordinates(_WrappedLongitude(field)).lin2arbJacobian(x, y) is None
+    )
@@ -0,0 +1,54 @@
+# -*- mode: python; coding: utf-8 -*-
+# Copyright Peter Williams <peter@newton.cx> and collaborators.
+# Licensed under the MIT License.
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cairo")
+
+from omega import rect
+
+F = rect.RectDataHolder.AxisTypeFloat
+
+
+def _ringHolder(capacity):
+    h = rect.AppendableRectDataHolder(F, F, capacity=capacity)
+    h.register(0, 0, 1, 1)
+    return h
+
+
+def test_ring_oversized_extend_bounds():
+    h = _ringHolder(4)
+    x = np.arange(10.0)
+    h.extendFloats(x, 2 * x)
+
+    assert h.getDataBounds() == (6, 9, 12, 18)
+    np.testing.assert_array_equal(h.getAll()[2][0], [6, 7, 8, 9])
+
+
+def test_ring_eviction_bounds():
+    h = _ringHolder(4)
+    h.extendFloats([5.0, 1.0, 2.0], [0.0, 1.0, 2.0])
+    h.extendFloats([3.0, 4.0], [3.0, 4.0])
+
+    assert h.getDataBounds() == (1, 4, 1, 4)
+
+
+def test_clamped_mapping_shares_cache():
+    field = rect.RectField()
+    field.setBounds(0, 1, 0, 1)
+    h = rect.RectDataHolder(F, F)
+    h.register(0, 0, 1, 1)
+    h.setFloats(np.array([-5.0, 0.5, 5.0]), np.array([0.25, 9.0, -9.0]))
+
+    raw = field.makeTransformer(100, 50, False)
+    clamped = field.makeTransformer(100, 50, True)
+    rx, ry = h.getAllMapped(raw)[2:]
+    cx, cy = h.getAllMapped(clamped)[2:]
+
+    assert len(h._mappedCache) == 1
+    np.testing.assert_array_equal(cx, clamped.mapX(h.getAll()[2]))
+    np.testing.assert_array_equal(cy, clamped.mapY(h.getAll()[3]))
+    np.testing.assert_array_equal(cx[0], [-100, 50, 200])
+    np.testing.assert_array_equal(rx[0], [-500, 50, 500])